@@ -0,0 +1,120 @@
+"""
+Micro-benchmark of finding similar texts in the fuzzy index of the translation memory,
+compared with comparing each query with every text in the memory.
+then the index in a translation memory: made from the database in the first run, loaded from the cache folder
+with the texts added since in the next one, and the time a get of another language waits while it is loaded.
+
+usage: py benchmarks/fuzzy.py [number of memory texts ...]
+"""
+
+import sys
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "pz-translator"))
+from fuzzy_index import FuzzyIndex
+from placeholders import Placeholders
+from translation_memory import TranslationMemory
+
+WORDS = ["Open", "Close", "Crate", "Large", "Small", "Box", "uses left", "Tooltip", "Radio", "Battery", "Water", "Bottle",
+         "Empty", "Full", "Rotten", "Fresh", "Hammer", "Nails", "Plank", "Door", "Window", "Car", "Engine", "Key"]
+EXTRA = ["%1", "<br>", "<RGB:1,0,0>"]
+
+THRESHOLD = 0.8
+
+def make_words(rng: random.Random, count: int) -> list[str]:
+    'the common words and made up item and mod words'
+    return WORDS + ["".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(3, 9))).title() for _ in range(count)]
+
+def make_text(rng: random.Random, words: list[str]) -> str:
+    'random text of words and placeholders, common words are used more'
+
+    words = rng.choices(words, weights=[20] * len(WORDS) + [1] * (len(words) - len(WORDS)), k=rng.randint(2, 7))
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words)), rng.choice(EXTRA))
+    return " ".join(words)
+
+def brute_force(index: FuzzyIndex, source: str) -> float:
+    'best similarity with every text of the index'
+
+    grams = index.trigrams(index.normalize(source))
+    best = 0
+    for other in index.grams:
+        shared = len(grams & other)
+        best = max(best, shared / (len(grams) + len(other) - shared))
+    return best
+
+def load_memory(folder: Path, texts: list[str], added: list[str]) -> tuple[float, float, float]:
+    """
+    seconds to make the index from the memory, to load it again after added texts are put
+    and the longest get of another language while the index was made
+    """
+
+    placeholders = Placeholders()
+    memory = TranslationMemory(folder / "memory.sqlite", index_folder=folder / "fuzzy")
+    memory.put("es", {text: f"[es] {text}" for text in texts})
+    memory.put("de", {text: f"[de] {text}" for text in texts[:100]})
+    waits = []
+    def get_other():
+        while not done.is_set():
+            start = time.perf_counter()
+            memory.get("de", texts[:100])
+            waits.append(time.perf_counter() - start)
+            time.sleep(0.01)
+    done = threading.Event()
+    thread = threading.Thread(target=get_other)
+    thread.start()
+    start = time.perf_counter()
+    memory.fuzzy("es", texts[:1], THRESHOLD, placeholders)
+    made = time.perf_counter() - start
+    done.set()
+    thread.join()
+    memory.close()
+    memory = TranslationMemory(folder / "memory.sqlite", index_folder=folder / "fuzzy")
+    memory.put("es", {text: f"[es] {text}" for text in added})
+    start = time.perf_counter()
+    found = memory.fuzzy("es", [x + "s" for x in added], THRESHOLD, placeholders)
+    loaded = time.perf_counter() - start
+    assert len(found) >= len(added) // 2, "added texts are not in the index"
+    memory.close()
+    return made, loaded, max(waits)
+
+def main():
+    'run benchmark'
+
+    sizes = [int(x) for x in sys.argv[1:]] or [10_000, 100_000, 300_000]
+    rng = random.Random(1)
+    words = make_words(rng, 5000)
+    for size in sizes:
+        index = FuzzyIndex(Placeholders())
+        texts = [make_text(rng, words) for _ in range(size)]
+        start = time.perf_counter()
+        for text in texts:
+            index.add(text, f"[es] {text}")
+        built = time.perf_counter() - start
+        # half are edited memory texts, half are new
+        queries = [rng.choice(texts) + "s" for _ in range(500)] + [make_text(rng, words) for _ in range(500)]
+        start = time.perf_counter()
+        found = [index.search(x, THRESHOLD) for x in queries]
+        searched = time.perf_counter() - start
+        start = time.perf_counter()
+        best = [brute_force(index, x) for x in queries[:20]]
+        brute = (time.perf_counter() - start) / 20 * len(queries)
+        for query, match, score in zip(queries, found, best):
+            assert (match is not None) == (score >= THRESHOLD), f"different result for {query}"
+        matched = sum(x is not None for x in found)
+        print(f"{size:>8} texts  index {built:6.2f} s  {len(queries)} queries {searched*1000:8.1f} ms ({matched} similar)"
+              f"  compare all {brute:8.2f} s")
+    for size in sizes:
+        texts = list(dict.fromkeys(make_text(rng, words) for _ in range(size)))
+        added = [make_text(rng, words) for _ in range(100)]
+        with tempfile.TemporaryDirectory() as folder:
+            made, loaded, waited = load_memory(Path(folder), texts, added)
+        print(f"{size:>8} texts in memory  first run {made:6.2f} s  next run with 100 added {loaded:6.2f} s"
+              f"  longest get of another language {waited*1000:6.1f} ms")
+
+if __name__ == '__main__':
+    main()
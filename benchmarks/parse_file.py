@@ -0,0 +1,175 @@
+"""
+Micro-benchmark of File.parse_file over synthetic translation files,
+compared with the previous line by line implementation.
+
+usage: py benchmarks/parse_file.py [number of lines ...]
+"""
+
+import sys
+import random
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+from string import Template
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "pz-translator"))
+from translation_types import UI
+
+WORDS = ["Open", "Close", "Crate", "Large", "<RGB:1,0,0>", "%1", "uses left", "<br>", "Loading...", "$5"]
+
+class Parent:
+    'collects warnings'
+
+    def __init__(self):
+        self.warnings = []
+
+    def warn(self, message: str):
+        'store warning'
+        self.warnings.append(message)
+
+class LegacyTemplate(Template):
+    'previous string template'
+    idpattern = Template.delimiter
+    braceidpattern = r'([^}]*)'
+
+class LegacyUI(UI):
+    'previous implementation of parse_file'
+
+    def add_to_template(self, template: StringIO, text: str = None, is_key: bool = False, replace: list = None):
+        if template is None:
+            return
+        if is_key:
+            template.write("${"+text+"}")
+        else:
+            text = text.replace("$","$$")
+            if replace:
+                for k,v in replace:
+                    text = text.replace(k,v)
+            template.write(text)
+
+    def parse_file(self, fp: str, lang: dict, mapping: dict, create_template: bool, check_duplicate: bool) -> LegacyTemplate:
+        template = StringIO() if create_template else None
+        with open(fp,'r',encoding=lang["charset"]) as f:
+            key = ""
+            text = ""
+            concat = False
+            lines = None
+            line = f.readline()
+            self.add_to_template(template, line, False, [("_" + lang["name"], "_${__language_name__}")])
+            for line in f:
+                stripped = line.strip()
+                if "=" in stripped and "\"" in stripped:
+                    if concat:
+                        self.parent.warn(f'Concat interrupted for {key}')
+                        mapping[key] = mapping.get(key,"")
+                    index1 = line.index("=")
+                    index2 = line.index("\"",index1+1)
+                    index3 = line.rindex("\"")
+                    key = line[:index1].strip()
+                    text = line[index2+1:index3]
+                    if ".." in stripped:
+                        concat = True
+                    if self.PREFIXES and not any(key.startswith(pre) for pre in self.PREFIXES):
+                        self.parent.warn(f'Possibly misspelled key: {key}')
+                    key = key.replace("{","}")
+                    if check_duplicate and key in mapping:
+                        self.parent.warn(f'Duplicate key: {key}')
+                    if not key:
+                        self.parent.warn("No key in:\n" + line)
+                    else:
+                        self.add_to_template(template, line[:index2+1])
+                        self.add_to_template(template, key, True)
+                        self.add_to_template(template, line[index3:])
+                elif stripped and "--" not in stripped and (stripped.endswith("..") or concat):
+                    if concat and '"' in stripped:
+                        text = stripped[stripped.index("\"")+1:stripped.rindex("\"")]
+                    else:
+                        text = ""
+                    concat = True
+                else:
+                    concat = False
+                if concat and stripped.endswith(".."):
+                    if not lines:
+                        lines = ['']
+                        join_str = f'"..\n{line[:line.find(stripped[0])]}    "'
+                    if text:
+                        lines.append(text)
+                    continue
+                if lines:
+                    if text:
+                        lines.append(text)
+                    text = join_str.join(lines)
+                    lines = None
+                if key:
+                    if not text:
+                        self.parent.warn(f'{key} is missing translation')
+                    mapping[key] = text
+                else:
+                    self.add_to_template(template,line)
+                key = ""
+                text = ""
+                concat = False
+        if template:
+            text = template.getvalue()
+            template.close()
+            return LegacyTemplate(text)
+        return None
+
+def make_file(fp: Path, count: int):
+    'write synthetic UI file with count lines'
+
+    rng = random.Random(count)
+    with open(fp, "w", encoding="utf-8") as f:
+        f.write("UI_EN = {\n")
+        i = 0
+        while i < count:
+            kind = rng.random()
+            words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 6)))
+            if kind < 0.85:
+                f.write(f'    UI_key{i} = "{words}",\n')
+            elif kind < 0.9:
+                f.write(f'    UI_key{i} = "{words}"..\n        "{words}",\n')
+                i += 1
+            elif kind < 0.95:
+                f.write(f'    -- {words}\n')
+            else:
+                f.write("\n")
+            i += 1
+        f.write("}\n")
+
+def measure(cls, fp: Path, create_template: bool, repeat: int) -> tuple[float, tuple]:
+    'best time of parsing the file'
+
+    lang = {"name": "EN", "charset": "UTF-8"}
+    best = None
+    for _ in range(repeat):
+        parent = Parent()
+        mapping = {}
+        start = time.perf_counter()
+        template = cls(parent).parse_file(fp, lang, mapping, create_template, create_template)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    # templates are compared by their output with the keys left in
+    if isinstance(template, LegacyTemplate):
+        template = template.safe_substitute({})
+    elif template:
+        template = template.substitute({})
+    return best, (template, mapping, parent.warnings)
+
+def main():
+    'run benchmark'
+
+    sizes = [int(x) for x in sys.argv[1:]] or [10_000, 100_000]
+    with tempfile.TemporaryDirectory() as folder:
+        for size in sizes:
+            fp = Path(folder) / f"UI_EN_{size}.txt"
+            make_file(fp, size)
+            for create_template, label in [(True, "source"), (False, "translation")]:
+                legacy, legacy_result = measure(LegacyUI, fp, create_template, 5)
+                current, current_result = measure(UI, fp, create_template, 5)
+                assert legacy_result == current_result, "parse results differ"
+                print(f"{size:>8} lines {label:<12} legacy {legacy*1000:8.1f} ms  current {current*1000:8.1f} ms  speedup {legacy/current:4.1f}x")
+
+if __name__ == '__main__':
+    main()
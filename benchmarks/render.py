@@ -0,0 +1,81 @@
+"""
+Micro-benchmark of writing translation files from a parsed source,
+compared with the previous string template rendered as a whole for each language.
+shows the time and the peak memory used while writing all languages.
+
+usage: py benchmarks/render.py [number of lines ...]
+"""
+
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "pz-translator"))
+from translation_types import UI
+from parse_file import Parent, LegacyUI, make_file
+
+LANGUAGES = [{"name": x, "charset": "UTF-8"} for x in ["ES", "DE", "FR", "IT", "PL", "PT", "RU", "TR"]]
+
+def translations(mapping: dict, lang: dict) -> dict:
+    'fake translations for language'
+
+    texts = {key: f"[{lang['name']}] {text}" for key, text in mapping.items()}
+    texts["__language_name__"] = lang["name"]
+    return texts
+
+def write_legacy(folder: Path, template, tr_maps: list):
+    'render the whole file as a string, then write it'
+
+    for lang, tr_map in zip(LANGUAGES, tr_maps):
+        text = template.safe_substitute(tr_map)
+        with open(folder / f"legacy_{lang['name']}.txt", "w", encoding=lang["charset"], errors="replace") as f:
+            f.write(text)
+
+def write_stream(folder: Path, template, tr_maps: list):
+    'render the compiled template into the file'
+
+    for lang, tr_map in zip(LANGUAGES, tr_maps):
+        with open(folder / f"stream_{lang['name']}.txt", "w", encoding=lang["charset"], errors="replace") as f:
+            template.render(f.write, tr_map)
+
+def measure(function, folder: Path, template, tr_maps: list, repeat: int) -> tuple[float, int]:
+    'best time and peak memory of writing all languages'
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(folder, template, tr_maps)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    function(folder, template, tr_maps)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+def main():
+    'run benchmark'
+
+    sizes = [int(x) for x in sys.argv[1:]] or [10_000, 100_000]
+    source = {"name": "EN", "charset": "UTF-8"}
+    with tempfile.TemporaryDirectory() as folder:
+        folder = Path(folder)
+        for size in sizes:
+            fp = folder / f"UI_EN_{size}.txt"
+            make_file(fp, size)
+            mapping = {}
+            legacy_template = LegacyUI(Parent()).parse_file(fp, source, {}, True, False)
+            template = UI(Parent()).parse_file(fp, source, mapping, True, False)
+            tr_maps = [translations(mapping, lang) for lang in LANGUAGES]
+            legacy, legacy_peak = measure(write_legacy, folder, legacy_template, tr_maps, 5)
+            current, current_peak = measure(write_stream, folder, template, tr_maps, 5)
+            for lang in LANGUAGES:
+                legacy_text = (folder / f"legacy_{lang['name']}.txt").read_bytes()
+                assert legacy_text == (folder / f"stream_{lang['name']}.txt").read_bytes(), "outputs differ"
+            print(f"{size:>8} lines {len(LANGUAGES)} languages  legacy {legacy*1000:8.1f} ms {legacy_peak/2**20:6.1f} MiB"
+                  f"  stream {current*1000:8.1f} ms {current_peak/2**20:6.1f} MiB")
+
+if __name__ == '__main__':
+    main()
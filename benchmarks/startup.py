@@ -0,0 +1,51 @@
+"""
+Startup time of the translator: importing translate.py and running --help in a new interpreter,
+and the network and process modules that were imported, which should only be loaded when they are used.
+
+usage: py benchmarks/startup.py [repeat]
+"""
+
+import sys
+import json
+import subprocess
+import time
+from pathlib import Path
+
+FOLDER = Path(__file__).parent.parent / "pz-translator"
+
+# modules that no-op and plan runs don't need
+LAZY_MODULES = ["deep_translator", "requests", "urllib.request", "http.server", "http.client", "multiprocessing", "cProfile"]
+
+CHECK = f"""
+import sys, json
+import translate
+print(json.dumps([x for x in {LAZY_MODULES!r} if x in sys.modules]))
+"""
+
+def best_time(args: list[str], repeat: int) -> float:
+    'best wall time of running python with args'
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=FOLDER, stdout=subprocess.DEVNULL, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    'run benchmark'
+
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    empty = best_time(["-c", "pass"], repeat)
+    imported = best_time(["-c", "import translate"], repeat)
+    helped = best_time(["translate.py", "--help"], repeat)
+    print(f"python startup       {empty*1000:7.1f} ms")
+    print(f"import translate     {imported*1000:7.1f} ms  (+{(imported-empty)*1000:.1f} ms)")
+    print(f"translate.py --help  {helped*1000:7.1f} ms  (+{(helped-empty)*1000:.1f} ms)")
+    output = subprocess.run([sys.executable, "-c", CHECK], cwd=FOLDER, capture_output=True, text=True, check=True).stdout
+    loaded = json.loads(output)
+    print(f"modules loaded by the import that should be lazy: {', '.join(loaded) or 'none'}")
+
+if __name__ == '__main__':
+    main()
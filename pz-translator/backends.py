@@ -0,0 +1,285 @@
+"""
+Translation services used to translate texts
+"""
+
+import sys
+import json
+import time
+import random
+import threading
+from pathlib import Path
+from configparser import ConfigParser, SectionProxy
+
+SEPARATOR = "\n"
+
+class BackendError(Exception):
+    'translation request failed'
+
+class RateLimitError(BackendError):
+    'translation service rejected the request because of too many requests'
+
+class Backend:
+    """
+    Base class for translation services.
+    translate_batch joins texts into one request by default, services with batch requests override it.
+    """
+
+    name: str
+    max_chars: int = 5000
+    joins_texts: bool = True
+
+    def __init__(self, source: str, options: SectionProxy | dict = None):
+        self.source = source
+        self.options = options if options is not None else {}
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def count_call(self):
+        'count requests to the service'
+        with self.lock:
+            self.calls += 1
+
+    def translate(self, text: str, target: str) -> str:
+        'translate single text'
+        raise NotImplementedError()
+
+    def translate_batch(self, texts: list[str], target: str) -> list[str]:
+        'translate texts in one request, the result may not match the texts if the service changed the separators'
+
+        result = self.translate(SEPARATOR.join(texts), target)
+        return [x.strip("\r") for x in result.split(SEPARATOR)] if result else []
+
+    @classmethod
+    def supported_languages(cls) -> dict[str, str]:
+        'return {language name: code}'
+        raise NotImplementedError()
+
+class TimeoutRequests:
+    'requests module used by deep_translator, with a timeout for each request because its translators do not take one'
+
+    def __init__(self, module, timeout: float):
+        self.module = module
+        self.timeout = timeout
+
+    def get(self, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.module.get(*args, **kwargs)
+
+    def __getattr__(self, name: str):
+        return getattr(self.module, name)
+
+class GoogleBackend(Backend):
+    "Google translate using deep_translator"
+
+    name = "google"
+    max_chars = 4999
+
+    def __init__(self, source: str, options: SectionProxy | dict = None):
+        super().__init__(source, options)
+        # clients are not thread safe, each thread uses its own
+        self.local = threading.local()
+        self.timeout = float(self.options.get("timeout", 60) or 60)
+
+    def get_client(self, target: str):
+        'return client of this thread for the target language'
+
+        clients = getattr(self.local, "clients", None)
+        if clients is None:
+            clients = self.local.clients = {}
+        client = clients.get(target)
+        if client is None:
+            from deep_translator import GoogleTranslator, google
+            with self.lock:
+                if not isinstance(google.requests, TimeoutRequests):
+                    google.requests = TimeoutRequests(google.requests, self.timeout)
+            client = clients[target] = GoogleTranslator(self.source, target)
+        return client
+
+    def translate(self, text: str, target: str) -> str:
+        self.count_call()
+        from deep_translator.exceptions import BaseError, TooManyRequests, RequestError, ServerException
+        from requests import RequestException
+        try:
+            return self.get_client(target).translate(text)
+        except TooManyRequests as e:
+            raise RateLimitError(str(e)) from e
+        # connection errors and timeouts, server errors and responses without a translation
+        except (RequestError, ServerException, BaseError, RequestException) as e:
+            raise BackendError(f"{type(e).__name__}: {e}") from e
+
+    @classmethod
+    def supported_languages(cls) -> dict[str, str]:
+        from deep_translator import GoogleTranslator
+        return GoogleTranslator().get_supported_languages(True)
+
+LOCAL_LANGUAGES = {
+    "catalan": "ca", "chinese (simplified)": "zh-CN", "chinese (traditional)": "zh-TW", "czech": "cs",
+    "danish": "da", "dutch": "nl", "english": "en", "filipino": "tl", "finnish": "fi", "french": "fr",
+    "german": "de", "hungarian": "hu", "indonesian": "id", "italian": "it", "japanese": "ja", "korean": "ko",
+    "norwegian": "no", "polish": "pl", "portuguese": "pt", "romanian": "ro", "russian": "ru", "spanish": "es",
+    "thai": "th", "turkish": "tr", "ukrainian": "uk",
+}
+
+class LocalBackend(Backend):
+    """
+    Offline stand-in for a translation service, for testing and measuring without network.
+    every line is returned as "[target] line" after a delay,
+    options: latency (seconds per request), charsPerSecond, requestsPerSecond (more requests are rejected),
+    errorRate (fraction of failed requests), seed.
+    """
+
+    name = "local"
+
+    def __init__(self, source: str, options: SectionProxy | dict = None):
+        super().__init__(source, options)
+        self.latency = float(self.options.get("latency", 0) or 0)
+        self.chars_per_second = float(self.options.get("charsPerSecond", 0) or 0)
+        self.requests_per_second = float(self.options.get("requestsPerSecond", 0) or 0)
+        self.error_rate = float(self.options.get("errorRate", 0) or 0)
+        seed = self.options.get("seed", None)
+        self.random = random.Random(int(seed) if seed else None)
+        self.tokens = self.requests_per_second
+        self.refilled = time.monotonic()
+
+    def check_rate(self):
+        'reject requests above the requests per second limit'
+
+        if self.requests_per_second <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.requests_per_second, self.tokens + (now - self.refilled) * self.requests_per_second)
+            self.refilled = now
+            if self.tokens < 1:
+                raise RateLimitError("Too many requests")
+            self.tokens -= 1
+
+    def translate(self, text: str, target: str) -> str:
+        return self.respond([text], target)[0]
+
+    def respond(self, texts: list[str], target: str) -> list[str]:
+        'simulate one request translating the texts'
+
+        self.count_call()
+        self.check_rate()
+        delay = self.latency
+        if self.chars_per_second > 0:
+            delay += sum(len(x) for x in texts) / self.chars_per_second
+        if delay > 0:
+            time.sleep(delay)
+        with self.lock:
+            failed = self.error_rate > 0 and self.random.random() < self.error_rate
+        if failed:
+            raise BackendError("Simulated error")
+        return [SEPARATOR.join(f"[{target}] {line}" if line.strip() else line for line in text.split(SEPARATOR)) for text in texts]
+
+    @classmethod
+    def supported_languages(cls) -> dict[str, str]:
+        return dict(LOCAL_LANGUAGES)
+
+class HttpBackend(Backend):
+    """
+    Client for a translation server with a json api, like the one started by `backends.py serve`.
+    POST {url}/translate {"source": code, "target": code, "q": [texts]} -> {"translations": [texts]}
+    """
+
+    name = "http"
+    joins_texts = False
+
+    def __init__(self, source: str, options: SectionProxy | dict = None):
+        super().__init__(source, options)
+        self.url = str(self.options.get("url", "http://127.0.0.1:8765")).rstrip("/")
+        self.timeout = float(self.options.get("timeout", 60) or 60)
+        self.max_chars = int(self.options.get("maxChars", 5000) or 5000)
+
+    def translate(self, text: str, target: str) -> str:
+        return self.translate_batch([text], target)[0]
+
+    def translate_batch(self, texts: list[str], target: str) -> list[str]:
+        from urllib import request, error
+        self.count_call()
+        data = json.dumps({"source": self.source, "target": target, "q": texts}).encode("utf-8")
+        req = request.Request(f"{self.url}/translate", data, {"Content-Type": "application/json"})
+        try:
+            with request.urlopen(req, timeout=self.timeout) as response:
+                return json.load(response)["translations"]
+        except error.HTTPError as e:
+            if e.code == 429:
+                raise RateLimitError(f"HTTP {e.code}") from e
+            raise BackendError(f"HTTP {e.code}") from e
+        except (error.URLError, OSError, ValueError, KeyError) as e:
+            raise BackendError(str(e)) from e
+
+    @classmethod
+    def supported_languages(cls) -> dict[str, str]:
+        return dict(LOCAL_LANGUAGES)
+
+BACKENDS: dict[str, type[Backend]] = {
+    "google": GoogleBackend,
+    "local": LocalBackend,
+    "http": HttpBackend,
+}
+
+def create_backend(config: ConfigParser, source: str) -> Backend:
+    'create the backend set in the [Backend] section of the config'
+
+    if not config.has_section("Backend"):
+        config.add_section("Backend")
+    options = config["Backend"]
+    name = options.get("name", "google")
+    assert name in BACKENDS, f"Unknown translation backend: {name}"
+    return BACKENDS[name](source, options)
+
+def serve(address: str, backend: LocalBackend):
+    'run the local backend as a http translation server'
+
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        'translation request handler'
+
+        def do_POST(self):
+            'translate texts'
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                self.reply(200, {"translations": backend.respond(body["q"], body["target"])})
+            except RateLimitError as e:
+                self.reply(429, {"error": str(e)})
+            except (BackendError, ValueError, KeyError) as e:
+                self.reply(500, {"error": str(e)})
+
+        def reply(self, code: int, data: dict):
+            'send json response'
+            payload = json.dumps(data).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    host, _, port = address.rpartition(":")
+    server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), Handler)
+    print(f"Serving local translations on http://{host or '127.0.0.1'}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def main():
+    'serve the local backend: backends.py serve [host:port], uses the [Backend] options of config.ini'
+
+    if len(sys.argv) < 2 or sys.argv[1] != "serve":
+        print("usage: backends.py serve [host:port]")
+        return
+    config = ConfigParser()
+    config.read(Path(__file__).parent.parent / "config.ini")
+    options = config["Backend"] if config.has_section("Backend") else {}
+    serve(sys.argv[2] if len(sys.argv) > 2 else "127.0.0.1:8765", LocalBackend("en", options))
+
+if __name__ == '__main__':
+    main()
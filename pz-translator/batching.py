@@ -0,0 +1,108 @@
+"""
+Pack many texts into few translation requests
+"""
+
+from typing import Iterator, Callable
+from backends import Backend, BackendError, SEPARATOR
+
+class BatchTranslator:
+    """
+    Translates lists of texts by joining them into batches that fit the backend limits,
+    splitting the results back per text. Batches that come back malformed or fail are translated one text at a time,
+    texts that still fail are skipped, unless max_failures texts in a row fail.
+    """
+
+    def __init__(self, backend: Backend, target: str, max_chars: int = 4500, max_items: int = 100, max_failures: int = 3):
+        self.backend = backend
+        self.target = target
+        self.max_chars = min(max_chars, backend.max_chars)
+        self.max_items = max_items
+        self.max_failures = max_failures
+        self.calls = 0
+        self.fallbacks = 0
+        self.failed = 0
+        self.failed_in_row = 0
+
+    def is_batchable(self, text: str) -> bool:
+        'texts that can be joined with other texts'
+        if self.backend.joins_texts and (SEPARATOR in text or "\r" in text):
+            return False
+        return len(text) < self.max_chars
+
+    def make_batches(self, texts: list[str]) -> list[list[int]]:
+        """
+        return batches of indexes into texts, keeping the original order.
+        empty texts are left out.
+        """
+
+        batches = []
+        batch = []
+        size = 0
+        for i, text in enumerate(texts):
+            if not text.strip():
+                continue
+            if self.max_chars <= 0 or not self.is_batchable(text):
+                if batch:
+                    batches.append(batch)
+                    batch, size = [], 0
+                batches.append([i])
+                continue
+            extra = len(text) + (len(SEPARATOR) if batch else 0)
+            if batch and (size + extra > self.max_chars or len(batch) >= self.max_items):
+                batches.append(batch)
+                batch, size = [], 0
+                extra = len(text)
+            batch.append(i)
+            size += extra
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def call(self, text: str) -> str | None:
+        'single backend call, returns None if it failed'
+
+        self.calls += 1
+        try:
+            result = self.backend.translate(text, self.target)
+        except BackendError:
+            self.failed += 1
+            self.failed_in_row += 1
+            if self.failed_in_row >= self.max_failures:
+                raise
+            return None
+        self.failed_in_row = 0
+        return result
+
+    def translate_batch(self, texts: list[str]) -> list[str | None]:
+        'translate a batch of texts, falls back to single calls if the result does not split back'
+
+        if len(texts) == 1:
+            return [self.call(texts[0])]
+        self.calls += 1
+        try:
+            parts = self.backend.translate_batch(texts, self.target)
+        except BackendError:
+            parts = []
+        if len(parts) == len(texts) and all(parts):
+            self.failed_in_row = 0
+            return parts
+        self.fallbacks += 1
+        return [self.call(text) for text in texts]
+
+    def translate(self, texts: list[str], allow: Callable[[int], bool] = None) -> Iterator[tuple[int, str]]:
+        """
+        translate texts, yields (index, translation) as each batch is done.
+        empty texts are yielded unchanged without a backend call, texts that failed are not yielded.
+        allow is called with the characters of each batch before it is sent, translation stops when it returns False.
+        """
+
+        for i, text in enumerate(texts):
+            if not text.strip():
+                yield i, text
+        for batch in self.make_batches(texts):
+            if allow is not None and not allow(sum(len(texts[i]) for i in batch)):
+                return
+            results = self.translate_batch([texts[i] for i in batch])
+            for i, result in zip(batch, results):
+                if result is not None:
+                    yield i, result
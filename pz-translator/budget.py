@@ -0,0 +1,63 @@
+"""
+Limits of a run: wall-clock deadline and characters sent for translation
+"""
+
+import time
+import threading
+
+class Budget:
+    """
+    Allows sending texts for translation until the deadline (time.time() timestamp) or the character budget is reached.
+    once a limit is reached nothing more is allowed, requests in progress finish and the rest is left for the next run.
+    0 means no limit.
+    shared is a multiprocessing Value with the characters sent by all processes of the run, the budget is for all of them.
+    """
+
+    def __init__(self, deadline: float = 0, max_chars: int = 0, shared=None):
+        self.deadline = deadline
+        self.max_chars = max_chars
+        self.shared = shared
+        self.chars = 0
+        self.exhausted = False
+        self.lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        'True if there is a limit'
+        return bool(self.deadline or self.max_chars)
+
+    def allow(self, chars: int) -> bool:
+        'take chars from the budget, False if the budget is used up'
+
+        with self.lock:
+            if self.exhausted:
+                return False
+            if self.deadline and time.time() >= self.deadline:
+                self.exhausted = True
+                return False
+            if self.shared is not None and self.max_chars:
+                with self.shared.get_lock():
+                    if self.shared.value + chars > self.max_chars:
+                        self.exhausted = True
+                        return False
+                    self.shared.value += chars
+            elif self.max_chars and self.chars + chars > self.max_chars:
+                self.exhausted = True
+                return False
+            self.chars += chars
+            return True
+
+    def summary(self) -> str:
+        'budget counters'
+
+        limits = []
+        if self.max_chars and self.shared is not None:
+            limits.append(f"{self.chars} characters, {self.shared.value}/{self.max_chars} by all processes")
+        elif self.max_chars:
+            limits.append(f"{self.chars}/{self.max_chars} characters")
+        if self.deadline:
+            limits.append("deadline reached" if time.time() >= self.deadline else "deadline not reached")
+        text = f"Budget: {', '.join(limits)}"
+        if self.exhausted:
+            text += ", stopped early, the remaining texts are translated in the next run"
+        return text
@@ -0,0 +1,79 @@
+"""
+Journal of auto-translations, saved while translating so interrupted runs can resume
+"""
+
+import os
+import json
+import time
+from pathlib import Path
+
+class Journal:
+    """
+    Append-only journal of auto-translations for one translation file.
+    each line is a json object {"k": key, "s": source text, "t": translation},
+    lines are written in whole chunks every few keys or seconds and synced to disk,
+    a line cut short by a crash is ignored when reading.
+    """
+
+    def __init__(self, path: Path, every_keys: int = 50, every_seconds: float = 10.0):
+        self.path = path
+        self.every_keys = every_keys
+        self.every_seconds = every_seconds
+        self.pending: list[str] = []
+        self.last_flush = time.monotonic()
+        self.checked_end = False
+
+    def read(self, source_texts: dict) -> dict:
+        'return saved translations for keys whose source text is the same'
+
+        texts = {}
+        if not self.path.is_file():
+            return texts
+        with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    key, source, text = entry["k"], entry["s"], entry["t"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if source_texts.get(key, None) == source and text:
+                    texts[key] = text
+        return texts
+
+    def add(self, key: str, source: str, text: str):
+        'add translation, written to disk when enough keys or time passed'
+
+        self.pending.append(json.dumps({"k": key, "s": source, "t": text}, ensure_ascii=False) + "\n")
+        if len(self.pending) >= self.every_keys or time.monotonic() - self.last_flush >= self.every_seconds:
+            self.flush()
+
+    def flush(self):
+        'append pending translations to the journal file'
+
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return
+        data = "".join(self.pending).encode("utf-8")
+        self.pending = []
+        if not self.checked_end:
+            # start on a new line if the last run stopped in the middle of a line
+            self.checked_end = True
+            if self.path.is_file() and self.path.stat().st_size:
+                with open(self.path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        data = b"\n" + data
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            while data:
+                data = data[os.write(fd, data):]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def remove(self):
+        'delete the journal when all texts are translated'
+
+        self.pending = []
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,163 @@
+"""
+Index of the files under a folder made with one walk, so paths are not checked one by one
+"""
+
+import os
+import stat
+import threading
+from pathlib import Path
+
+def stat_file(fp: Path) -> tuple[int, int] | None:
+    'size and mtime of the file, None if it is not a file'
+
+    try:
+        st = os.stat(fp)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns) if stat.S_ISREG(st.st_mode) else None
+
+class DirectoryIndex:
+    """
+    Folders and files under root, with the size and mtime of the files, from one walk of the tree.
+    paths outside root are checked on the file system, links to folders are not followed.
+    the translator updates the index for the files it writes or removes and the folders it creates.
+    """
+
+    def __init__(self, root: Path):
+        # the root as given and with links resolved, paths of the translator use both
+        self.prefixes = []
+        for path in dict.fromkeys([os.path.abspath(root), str(Path(root).resolve())]):
+            self.prefixes.append((path, os.path.join(path, "")))
+        self.files: dict[str, tuple[int, int]] = {}
+        # names of the entries of each folder, by path relative to root
+        self.dirs: dict[str, list[str]] = {}
+        # links to folders, paths in them are checked on the file system
+        self.links: set[str] = set()
+        self.lock = threading.Lock()
+        self.walk(self.prefixes[0][0])
+
+    def walk(self, root: str):
+        'index the tree'
+
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            names = []
+            try:
+                with os.scandir(os.path.join(root, rel) if rel else root) as entries:
+                    for entry in entries:
+                        names.append(entry.name)
+                        sub = os.path.join(rel, entry.name) if rel else entry.name
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(sub)
+                            elif entry.is_symlink() and entry.is_dir():
+                                self.links.add(sub)
+                            elif entry.is_file():
+                                st = entry.stat()
+                                self.files[sub] = (st.st_size, st.st_mtime_ns)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+            self.dirs[rel] = names
+
+    def relative(self, path: Path) -> str | None:
+        'path relative to root, None if it is outside root'
+
+        path = os.path.abspath(path)
+        for root, prefix in self.prefixes:
+            if path == root:
+                return ""
+            if path.startswith(prefix):
+                rel = path[len(prefix):]
+                if self.links and any(rel == x or rel.startswith(os.path.join(x, "")) for x in self.links):
+                    return None
+                return rel
+        return None
+
+    def stat(self, path: Path) -> tuple[int, int] | None:
+        'size and mtime of the file, None if it is not a file'
+
+        rel = self.relative(path)
+        if rel is None:
+            return stat_file(path)
+        with self.lock:
+            return self.files.get(rel)
+
+    def is_file(self, path: Path) -> bool:
+        'True if path is a file'
+        return self.stat(path) is not None
+
+    def is_dir(self, path: Path) -> bool:
+        'True if path is a folder'
+
+        rel = self.relative(path)
+        if rel is None:
+            return os.path.isdir(path)
+        with self.lock:
+            return rel in self.dirs
+
+    def list_dir(self, path: Path) -> list[str]:
+        'names of the entries of the folder'
+
+        rel = self.relative(path)
+        if rel is None:
+            return os.listdir(path) if os.path.isdir(path) else []
+        with self.lock:
+            return list(self.dirs.get(rel, []))
+
+    def find(self, folder: Path, name: str) -> list[Path]:
+        'files with the name in the folder and its subfolders'
+
+        rel = self.relative(folder)
+        if rel is None:
+            return sorted(Path(folder).rglob(name))
+        found = []
+        stack = [(rel, Path(folder))]
+        with self.lock:
+            while stack:
+                rel, path = stack.pop()
+                for entry in self.dirs.get(rel, []):
+                    sub = os.path.join(rel, entry) if rel else entry
+                    if sub in self.dirs:
+                        stack.append((sub, path / entry))
+                    elif entry == name and sub in self.files:
+                        found.append(path / entry)
+        return sorted(found)
+
+    def add_entry(self, rel: str):
+        'add the entry to its folder, call with the lock'
+
+        parent, name = os.path.split(rel)
+        names = self.dirs.get(parent)
+        if names is not None and name not in names:
+            names.append(name)
+
+    def update(self, path: Path):
+        'read the size and mtime of the file again after it was written or removed'
+
+        rel = self.relative(path)
+        if rel is None:
+            return
+        signature = stat_file(path)
+        with self.lock:
+            if signature is None:
+                self.files.pop(rel, None)
+                names = self.dirs.get(os.path.dirname(rel))
+                if names is not None and os.path.basename(rel) in names:
+                    names.remove(os.path.basename(rel))
+            else:
+                self.files[rel] = signature
+                self.add_entry(rel)
+
+    def add_dir(self, path: Path):
+        'add a created folder'
+
+        rel = self.relative(path)
+        if rel is None:
+            return
+        with self.lock:
+            self.dirs.setdefault(rel, [])
+            if rel:
+                self.add_entry(rel)
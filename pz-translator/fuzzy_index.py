@@ -0,0 +1,198 @@
+"""
+Index of translated texts for finding similar source texts
+"""
+
+import os
+import math
+import marshal
+import threading
+from array import array
+from collections import Counter
+from pathlib import Path
+from placeholders import Placeholders
+
+INDEX_VERSION = 2
+
+class FuzzyIndex:
+    """
+    Character trigram index of the source texts translated to one language.
+    texts are compared by the Jaccard similarity of their trigrams, lowercased and with placeholders replaced by tokens,
+    so texts that differ only in placeholders are the same.
+    postings are kept by the number of trigrams of the texts, so only texts of a length that can be similar are read.
+    a text of m trigrams with the threshold similarity t shares at least t * (n + m) / (1 + t) of the n trigrams of the query,
+    so it has one of the rarest n - t * (n + m) / (1 + t) + 1 and only the postings of those are read.
+    """
+
+    # shorter texts have too few trigrams to compare
+    MIN_CHARS = 6
+
+    def __init__(self, placeholders: Placeholders):
+        self.placeholders = placeholders
+        self.sources: list[str] = []
+        # None for removed texts, their postings stay
+        self.texts: list[str | None] = []
+        self.normalized: list[str] = []
+        # trigrams of the texts, made again from the normalized text when needed after loading
+        self.grams: list[frozenset[str] | None] = []
+        # number of trigrams of the text: {trigram: indexes of the texts}, loaded postings are bytes until they are used
+        self.postings: dict[int, dict[str, array | bytes]] = {}
+        self.frequency: Counter[str] = Counter()
+        # normalized text: index of the text
+        self.known: dict[str, int] = {}
+        # texts were added since the index was loaded
+        self.changed = False
+
+    def normalize(self, source: str) -> str | None:
+        'text compared for the source, None if it is too short'
+
+        text = " ".join(self.placeholders.protect(source)[0].lower().split())
+        return text if len(text) >= self.MIN_CHARS else None
+
+    @staticmethod
+    def trigrams(text: str) -> frozenset[str]:
+        'trigrams of the text, with the start and end of the text'
+
+        text = f"  {text} "
+        return frozenset(text[i:i+3] for i in range(len(text) - 2))
+
+    def get_grams(self, index: int) -> frozenset[str]:
+        'trigrams of the text'
+
+        grams = self.grams[index]
+        if grams is None:
+            grams = self.grams[index] = self.trigrams(self.normalized[index])
+        return grams
+
+    def get_postings(self, bucket: dict[str, array | bytes], gram: str) -> array | None:
+        'indexes of the texts with the trigram in the bucket'
+
+        found = bucket.get(gram)
+        if type(found) is bytes:
+            data = found
+            found = bucket[gram] = array("I")
+            found.frombytes(data)
+        return found
+
+    def add(self, source: str, text: str):
+        'add a translated source text, a text that is the same after normalizing replaces the one added before'
+
+        normalized = self.normalize(source)
+        if normalized is None:
+            return
+        self.changed = True
+        index = self.known.get(normalized)
+        if index is not None:
+            self.sources[index] = source
+            self.texts[index] = text
+            return
+        grams = self.trigrams(normalized)
+        index = self.known[normalized] = len(self.sources)
+        self.sources.append(source)
+        self.texts.append(text)
+        self.normalized.append(normalized)
+        self.grams.append(grams)
+        self.frequency.update(grams)
+        bucket = self.postings.get(len(grams))
+        if bucket is None:
+            bucket = self.postings[len(grams)] = {}
+        for gram in grams:
+            found = self.get_postings(bucket, gram)
+            if found is None:
+                bucket[gram] = array("I", (index,))
+            else:
+                found.append(index)
+
+    def remove(self, source: str):
+        'remove a text removed from the memory'
+
+        normalized = self.normalize(source)
+        index = self.known.get(normalized)
+        if index is not None and self.sources[index] == source:
+            del self.known[normalized]
+            self.texts[index] = None
+            self.changed = True
+
+    def search(self, source: str, threshold: float) -> tuple[str, str, float] | None:
+        'return (matched source, translation, similarity) of the most similar text at or above threshold'
+
+        normalized = self.normalize(source)
+        if normalized is None:
+            return None
+        grams = self.trigrams(normalized)
+        count = len(grams)
+        rarest = sorted(grams, key=self.frequency.__getitem__)
+        best = None
+        best_score = threshold
+        # texts of about the same length first, a better match makes the bounds of the next lengths tighter
+        sizes = range(math.ceil(threshold * count - 1e-9), math.floor(count / threshold + 1e-9) + 1)
+        for size in sorted(sizes, key=lambda x: abs(x - count)):
+            bucket = self.postings.get(size)
+            if bucket is None or not best_score * count - 1e-9 <= size <= count / best_score + 1e-9:
+                continue
+            prefix = count - math.ceil(best_score * (count + size) / (1 + best_score) - 1e-9) + 1
+            seen = set()
+            for gram in rarest[:prefix]:
+                for index in self.get_postings(bucket, gram) or ():
+                    if index in seen or self.texts[index] is None:
+                        continue
+                    seen.add(index)
+                    shared = len(grams & self.get_grams(index))
+                    score = shared / (count + size - shared)
+                    if score > best_score or best is None and score >= best_score:
+                        best = index
+                        best_score = score
+        if best is None:
+            return None
+        text = self.adapt(source, self.sources[best], self.texts[best])
+        if text is None:
+            return None
+        return self.sources[best], text, best_score
+
+    def adapt(self, source: str, match: str, text: str) -> str | None:
+        'translation of the matched text with the placeholders of source, None if they can not be matched'
+
+        spans = self.placeholders.protect(source)[1]
+        match_spans = self.placeholders.protect(match)[1]
+        if spans == match_spans:
+            return text
+        if len(spans) != len(match_spans) or len(set(match_spans)) != len(match_spans):
+            return None
+        replace = dict(zip(match_spans, spans))
+        protected, text_spans = self.placeholders.protect(text)
+        return self.placeholders.restore(protected, [replace.get(x, x) for x in text_spans])
+
+    def dump(self, fp: Path, state):
+        'save the index with the state of the memory it was made from'
+
+        # postings as bytes, loading them is much faster than lists of ints
+        postings = {size: {gram: found if type(found) is bytes else found.tobytes() for gram, found in bucket.items()}
+                    for size, bucket in self.postings.items()}
+        data = (INDEX_VERSION, self.placeholders.pattern.pattern, self.MIN_CHARS, array("I").itemsize, state,
+                self.sources, self.texts, self.normalized, dict(self.frequency), postings)
+        temp = fp.with_name(f"{fp.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            fp.parent.mkdir(parents=True, exist_ok=True)
+            with open(temp, "wb") as f:
+                marshal.dump(data, f)
+            os.replace(temp, fp)
+        except OSError:
+            temp.unlink(missing_ok=True)
+
+    @classmethod
+    def load(cls, fp: Path, placeholders: Placeholders) -> tuple["FuzzyIndex", object] | None:
+        'return the saved index and its memory state, None if there is none or it was made with other placeholders'
+
+        try:
+            with open(fp, "rb") as f:
+                version, pattern, min_chars, itemsize, state, sources, texts, normalized, frequency, postings = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if (version, pattern, min_chars, itemsize) != (INDEX_VERSION, placeholders.pattern.pattern, cls.MIN_CHARS, array("I").itemsize):
+            return None
+        index = cls(placeholders)
+        index.sources, index.texts, index.normalized = sources, texts, normalized
+        index.grams = [None] * len(normalized)
+        index.known = {x: i for i, x in enumerate(normalized) if texts[i] is not None}
+        index.frequency = Counter(frequency)
+        index.postings = postings
+        return index, state
@@ -6,7 +6,7 @@ import os
 import pathlib
 import json
 from configparser import ConfigParser
-from deep_translator import GoogleTranslator
+from backends import BACKENDS
 
 Aliases = {
     'AR': ['spanish'], #ar
@@ -50,8 +50,8 @@ def get_translate_codes(name):
     """
     return the codes for translations
     """
-    if name == "google":
-        return GoogleTranslator().get_supported_languages(True)
+    if name in BACKENDS:
+        return BACKENDS[name].supported_languages()
     return None
 
 def parse_language_file(fpath: pathlib.Path):
@@ -74,7 +74,9 @@ def generate_info():
     loop from all directories and gather information about the languages
     """
     translate_path = get_translate_path()
-    translate_codes = get_translate_codes("google")
+    config = ConfigParser()
+    config.read(pathlib.Path(__file__).parent.parent / "config.ini")
+    translate_codes = get_translate_codes(config.get("Backend","name",fallback="google"))
     info = {}
     with os.scandir(translate_path) as dir_entries:
         for each in dir_entries:
@@ -109,12 +111,12 @@ def get_languages_info(generate: bool = False) -> dict[str, dict]:
         d = generate_info()
         with open(ipath,"w",encoding="utf-8") as f:
             json.dump(d,f,indent=2)
-        write_gitattributes_template()
+        write_gitattributes_template(d)
         return d
     with open(ipath,"r",encoding="utf-8") as f:
         return json.load(f)
 
-def write_gitattributes_template():
+def write_gitattributes_template(languages: dict[str, dict]):
     'write gitattributes based on languages info'
 
     fp = pathlib.Path(__file__).parent.parent.joinpath("templates",".gitattributes")
@@ -123,7 +125,7 @@ def write_gitattributes_template():
 # see https://github.com/TheIndieStone/ProjectZomboidTranslations/blob/master/.gitattributes
 # see https://github.com/TheIndieStone/ProjectZomboidTranslations/issues/155
 """)
-        for name, lang in PZ_LANGUAGES.items():
+        for name, lang in languages.items():
             f.write(f'{name}/*.txt text working-tree-encoding={lang["charset"].lower()} encoding=utf-8,\n')
         f.write("""
 # exception: keep the language definition/credits utf-8
@@ -132,4 +134,19 @@ def write_gitattributes_template():
 */Translated by.txt text working-tree-encoding=utf-8 encoding=utf-8
 """)
 
-PZ_LANGUAGES = get_languages_info()
+_pz_languages = None
+
+def get_pz_languages() -> dict[str, dict]:
+    """
+    returns the languages information, loaded on first use so importing the modules stays fast
+    """
+    global _pz_languages
+    if _pz_languages is None:
+        _pz_languages = get_languages_info()
+    return _pz_languages
+
+def __getattr__(name: str):
+    # PZ_LANGUAGES is loaded when it is first used
+    if name == "PZ_LANGUAGES":
+        return get_pz_languages()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,162 @@
+"""
+Manifest of processed files, used to skip files that didn't change since the last run
+"""
+
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+from typing import Callable
+from dir_index import stat_file
+
+def file_hash(fp: Path) -> str:
+    'sha1 of file content'
+
+    h = hashlib.sha1()
+    with open(fp, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def file_signature(fp: Path | None, old: list = None, stat: Callable[[Path], tuple[int, int] | None] = stat_file) -> list | None:
+    """
+    return [size, mtime_ns, sha1] of the file or None if it doesn't exist.
+    the hash is reused from old signature when size and mtime didn't change.
+    stat returns the size and mtime, like the directory index of the translator.
+    """
+
+    if fp is None:
+        return None
+    st = stat(fp)
+    if st is None:
+        return None
+    if old and old[0] == st[0] and old[1] == st[1]:
+        return old
+    return [st[0], st[1], file_hash(fp)]
+
+class Manifest:
+    """
+    Records signatures of the files used to produce each translation file.
+    json file: {"config": hash, "entries": {"ES/UI_ES.txt": {"source": signature, ...}}}
+    """
+
+    def __init__(self, path: Path, config_hash: str):
+        self.path = path
+        self.config_hash = config_hash
+        self.entries: dict[str, dict] = {}
+        self.lock = threading.Lock()
+        self.changed = False
+        if path.is_file():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("config") == config_hash:
+                    self.entries = data.get("entries", {})
+            except (OSError, ValueError):
+                pass
+
+    def is_unchanged(self, key: str, paths: dict[str, Path | None], stat: Callable[[Path], tuple[int, int] | None] = stat_file) -> bool:
+        'check if files have the same content as when the entry was recorded'
+
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None or set(entry) != set(paths):
+            return False
+        for name, fp in paths.items():
+            old = entry[name]
+            sig = file_signature(fp, old, stat)
+            if sig is None or old is None:
+                if sig is old:
+                    continue
+                return False
+            if sig[0] != old[0] or sig[2] != old[2]:
+                return False
+            if sig is not old:
+                # content is the same, remember new mtime
+                with self.lock:
+                    entry[name] = sig
+                    self.changed = True
+        return True
+
+    def update(self, key: str, paths: dict[str, Path | None]):
+        'record current files for the entry'
+
+        with self.lock:
+            old = self.entries.get(key, {})
+        entry = {name: file_signature(fp, old.get(name)) for name, fp in paths.items()}
+        with self.lock:
+            self.entries[key] = entry
+            self.changed = True
+
+    def remove(self, key: str):
+        'forget entry'
+
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self.changed = True
+
+    def save(self):
+        'write manifest if changed'
+
+        if not self.changed:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp = self.path.with_suffix(".tmp")
+        with self.lock:
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump({"config": self.config_hash, "entries": self.entries}, f)
+            os.replace(temp, self.path)
+            self.changed = False
+
+def text_hash(text: str) -> str:
+    'short hash of text'
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+class Fingerprints:
+    """
+    Hashes of the source texts used for auto-translations, to find translations of changed source texts.
+    json file: {"ES/UI_ES.txt": {key: [source hash, translation hash]}}
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.files: dict[str, dict[str, list]] = {}
+        self.lock = threading.Lock()
+        self.changed = False
+        if path.is_file():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.files = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    def get(self, name: str) -> dict[str, list]:
+        'fingerprints of auto-translated keys of the file'
+
+        with self.lock:
+            return self.files.get(name, {})
+
+    def set(self, name: str, keys: dict[str, list]):
+        'replace fingerprints of the file'
+
+        with self.lock:
+            if self.files.get(name, {}) != keys:
+                if keys:
+                    self.files[name] = keys
+                else:
+                    self.files.pop(name, None)
+                self.changed = True
+
+    def save(self):
+        'write fingerprints if changed'
+
+        if not self.changed:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp = self.path.with_suffix(".tmp")
+        with self.lock:
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump(self.files, f)
+            os.replace(temp, self.path)
+            self.changed = False
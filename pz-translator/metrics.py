@@ -0,0 +1,110 @@
+"""
+Timing of the phases of a run and the run report
+"""
+
+import csv
+import json
+import time
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+# upper bounds in seconds of the histogram buckets, the last bucket has the slower ones
+BUCKETS = [0.001, 0.01, 0.1, 0.5, 1, 2, 5, 10, 30]
+
+class Metrics:
+    """
+    Collects the number of calls, total and slowest time and a histogram of durations for each phase.
+    times of phases running in several threads are added together.
+    """
+
+    def __init__(self):
+        self.phases: dict[str, dict] = {}
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def get_entry(self, phase: str) -> dict:
+        'counters of the phase, call with the lock'
+
+        entry = self.phases.get(phase)
+        if entry is None:
+            entry = self.phases[phase] = {"count": 0, "seconds": 0.0, "max": 0.0, "histogram": [0] * (len(BUCKETS) + 1)}
+        return entry
+
+    @contextmanager
+    def time(self, phase: str):
+        'measure the time of the block'
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def add(self, phase: str, seconds: float):
+        'add a measured duration of the phase'
+
+        with self.lock:
+            entry = self.get_entry(phase)
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+            i = 0
+            while i < len(BUCKETS) and seconds > BUCKETS[i]:
+                i += 1
+            entry["histogram"][i] += 1
+
+    def merge(self, phases: dict[str, dict]):
+        'add the phases of another report'
+
+        with self.lock:
+            for phase, other in phases.items():
+                entry = self.get_entry(phase)
+                entry["count"] += other["count"]
+                entry["seconds"] += other["seconds"]
+                entry["max"] = max(entry["max"], other["max"])
+                entry["histogram"] = [a + b for a, b in zip(entry["histogram"], other["histogram"])]
+
+    def report(self, counters: dict = None) -> dict:
+        'run report with the phases and counters'
+
+        with self.lock:
+            phases = {name: dict(entry, histogram=list(entry["histogram"])) for name, entry in self.phases.items()}
+        return {
+            "elapsed": time.monotonic() - self.started,
+            "buckets": BUCKETS,
+            "phases": phases,
+            "counters": counters or {},
+        }
+
+def write_report(path: Path, report: dict):
+    'write the report as csv if the file name ends with .csv, otherwise as json'
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix.lower() != ".csv":
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        return
+    labels = [f"<={x}s" for x in report["buckets"]] + [f">{report['buckets'][-1]}s"]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["phase", "count", "seconds", "mean", "max", *labels])
+        for name, entry in report["phases"].items():
+            mean = entry["seconds"] / entry["count"] if entry["count"] else 0
+            writer.writerow([name, entry["count"], f'{entry["seconds"]:.6f}', f"{mean:.6f}", f'{entry["max"]:.6f}', *entry["histogram"]])
+        writer.writerow([])
+        writer.writerow(["counter", "value"])
+        writer.writerow(["elapsed", f'{report["elapsed"]:.3f}'])
+        for name, value in report["counters"].items():
+            writer.writerow([name, value])
+
+def merge_reports(reports: list[dict], elapsed: float) -> dict:
+    'combine the reports of several runs, like the worker processes of one run'
+
+    metrics = Metrics()
+    counters = {}
+    for report in reports:
+        metrics.merge(report["phases"])
+        for name, value in report["counters"].items():
+            counters[name] = counters.get(name, 0) + value
+    return dict(metrics.report(counters), elapsed=elapsed)
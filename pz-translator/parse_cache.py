@@ -0,0 +1,79 @@
+"""
+Cache of parsed translation files, so unchanged files are not parsed again
+"""
+
+import os
+import marshal
+import hashlib
+import threading
+from pathlib import Path
+
+CACHE_VERSION = 2
+
+class ParseCache:
+    """
+    Stores the parse results of files in a folder, one marshal file per parsed file.
+    entries are keyed by the file path and the kind of parse, and are used only while the file size and mtime match.
+    with keep the entries are also kept in memory, for long running sessions.
+    a read_only cache only loads entries, for plans.
+    """
+
+    def __init__(self, folder: Path, keep: bool = False, read_only: bool = False):
+        self.folder = folder
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.kept: dict[Path, tuple[tuple[int, int], bytes]] | None = {} if keep else None
+        if not read_only:
+            folder.mkdir(parents=True, exist_ok=True)
+
+    def entry_path(self, fp: Path, kind: str) -> Path:
+        'cache file of the parsed file'
+        return self.folder / f'{hashlib.sha1(f"{fp.resolve()}|{kind}".encode("utf-8")).hexdigest()}.bin'
+
+    def load(self, fp: Path, kind: str, signature: tuple[int, int]):
+        'return the cached data of the file or None if the file changed'
+
+        path = self.entry_path(fp, kind)
+        kept = self.kept.get(path) if self.kept is not None else None
+        if kept is not None and kept[0] == signature:
+            # a new copy, callers can change the data
+            data = marshal.loads(kept[1])
+        else:
+            try:
+                with open(path, "rb") as f:
+                    version, size, mtime, data = marshal.load(f)
+            except (OSError, EOFError, ValueError, TypeError):
+                data = None
+            else:
+                if version != CACHE_VERSION or (size, mtime) != signature:
+                    data = None
+            if data is not None and self.kept is not None:
+                self.kept[path] = (signature, marshal.dumps(data))
+        with self.lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def store(self, fp: Path, kind: str, signature: tuple[int, int], data):
+        'save the parse results of the file, data can contain only builtin types'
+
+        path = self.entry_path(fp, kind)
+        if self.kept is not None:
+            self.kept[path] = (signature, marshal.dumps(data))
+        if self.read_only:
+            return
+        temp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(temp, "wb") as f:
+                marshal.dump((CACHE_VERSION, *signature, data), f)
+            os.replace(temp, path)
+        except OSError:
+            temp.unlink(missing_ok=True)
+
+    def summary(self) -> str:
+        'cache counters'
+        return f"Parse cache: {self.hits} hits, {self.misses} misses"
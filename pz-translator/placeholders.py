@@ -0,0 +1,105 @@
+"""
+Protect tags and format codes from changing during translation
+"""
+
+import re
+import threading
+
+# spans kept unchanged: tags like <br> and <RGB:1,0,0>, %1 arguments, Lua format codes, [img=...] icons
+PATTERNS = [
+    r"<[^<>\n]*>",
+    r"%\d+",
+    r"%(?:\.\d+)?[sdfgxq](?![A-Za-z])",
+    r"\[img=[^\]\n]*\]",
+    # texts that look like tokens, so they can't be confused with them
+    r"\{\d+\}",
+]
+
+# the default patterns as one alternation, the ones starting with % joined and the repeats possessive,
+# a span that can't end where a repeat stops is not tried again shorter
+DEFAULT_PATTERN = re.compile(r"(<[^<>\n]*+>|%(?:\d++|(?:\.\d+)?[sdfgxq](?![A-Za-z]))|\[img=[^\]\n]*+\]|\{\d++\})")
+
+# tokens as they were sent, and as translation services may return them with spaces inside the braces
+PLAIN_TOKEN = re.compile(r"\{(\d+)\}")
+TOKEN = re.compile(r"\{\s*(\d+)\s*\}")
+
+# protected source texts kept by protect_all, the cache is emptied when it has more
+CACHE_SIZE = 100_000
+
+class Placeholders:
+    """
+    Replaces protected spans with numbered tokens {0}, {1}, ... in one pass,
+    and puts them back after translation, checking every token came back exactly once.
+    extra patterns are regular expressions added to the default ones, they can't have capturing groups.
+    """
+
+    def __init__(self, extra: list[str] = None):
+        for pattern in extra or []:
+            assert re.compile(pattern).groups == 0, f"Use (?:...) instead of capturing groups in pattern: {pattern}"
+        self.pattern = re.compile("(" + "|".join(PATTERNS + extra) + ")") if extra else DEFAULT_PATTERN
+        # every default pattern starts with <, %, [ or {, texts without them are returned as they are
+        self.check_start = not extra
+        # the lists are replaced, not extended, when more tokens are needed, so threads can read them without the lock
+        self.lock = threading.Lock()
+        self.names = [str(i) for i in range(32)]
+        self.tokens = [f"{{{i}}}" for i in range(32)]
+        self.cache: dict[str, tuple[str, list[str]]] = {}
+
+    def get_tokens(self, count: int) -> list[str]:
+        'first count tokens'
+
+        with self.lock:
+            if len(self.tokens) < count:
+                size = max(count, 2 * len(self.tokens))
+                # names first, restore reads them for tokens given out by protect
+                self.names = [str(i) for i in range(size)]
+                self.tokens = [f"{{{i}}}" for i in range(size)]
+            return self.tokens[:count]
+
+    def protect(self, text: str) -> tuple[str, list[str]]:
+        'return text with tokens and the replaced spans'
+
+        if self.check_start and "<" not in text and "%" not in text and "[" not in text and "{" not in text:
+            return text, []
+        parts = self.pattern.split(text)
+        if len(parts) == 1:
+            return text, []
+        spans = parts[1::2]
+        parts[1::2] = self.tokens[:len(spans)] if len(spans) <= len(self.tokens) else self.get_tokens(len(spans))
+        return "".join(parts), spans
+
+    def protect_all(self, texts: list[str]) -> list[tuple[str, list[str]]]:
+        """
+        protect source texts, each target language translates the same texts so they are kept for the next ones.
+        the returned span lists are shared, they must not be changed.
+        """
+
+        cache = self.cache
+        if len(cache) > CACHE_SIZE:
+            cache = self.cache = {}
+        protect = self.protect
+        return [cache.get(text) or cache.setdefault(text, protect(text)) for text in texts]
+
+    def restore(self, text: str, spans: list[str]) -> str | None:
+        'return text with the spans back, None if tokens are missing, repeated or unknown'
+
+        if not spans:
+            return text
+        if len(spans) == 1:
+            # most tagged texts have one span, with one brace in the text it is the token
+            before, found, after = text.partition("{0}")
+            if found and "{" not in before and "{" not in after:
+                return before + spans[0] + after
+        # tokens usually come back unchanged and in order
+        parts = PLAIN_TOKEN.split(text)
+        if parts[1::2] == self.names[:len(spans)]:
+            parts[1::2] = spans
+            return "".join(parts)
+        parts = TOKEN.split(text)
+        found = parts[1::2]
+        if len(found) == len(spans) and sorted(int(x) for x in found) == list(range(len(spans))):
+            # tokens moved or changed, but each one is still there once
+            parts[1::2] = [spans[int(x)] for x in found]
+        else:
+            return None
+        return "".join(parts)
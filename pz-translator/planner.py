@@ -0,0 +1,109 @@
+"""
+Report of the pending work of a run, without translating
+"""
+
+import os
+import json
+from pathlib import Path
+
+# runs with fewer characters don't give a reliable throughput
+MIN_MEASURED_CHARS = 500
+
+def load_throughput(path: Path, backend: str) -> float | None:
+    'characters per second measured in earlier runs with the backend'
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)[backend]
+        return entry["chars"] / entry["seconds"]
+    except (OSError, ValueError, KeyError, TypeError, ZeroDivisionError):
+        return None
+
+def save_throughput(path: Path, backend: str, chars: int, seconds: float):
+    'save the characters translated in seconds by the backend'
+
+    if chars < MIN_MEASURED_CHARS or seconds <= 0:
+        return
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    data[backend] = {"chars": chars, "seconds": seconds}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+    os.replace(temp, path)
+
+def format_duration(seconds: float) -> str:
+    'short duration like 1h 5m, 3m 20s or 12s'
+
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60}s"
+    return f"{seconds}s"
+
+class Plan:
+    """
+    Pending work per translation file and language:
+    missing keys, unique texts left to translate after reusing translations, their characters and requests.
+    """
+
+    COLUMNS = ["missing", "unique", "chars", "requests"]
+
+    def __init__(self, backend: str, chars_per_second: float | None):
+        self.backend = backend
+        self.chars_per_second = chars_per_second
+        self.rows: list[dict] = []
+        self.warnings = 0
+
+    def add(self, folder: str, file: str, language: str, missing: int, unique: int, chars: int, requests: int):
+        'add pending work of one translation file'
+        self.rows.append({
+            "folder": folder, "file": file, "language": language,
+            "missing": missing, "unique": unique, "chars": chars, "requests": requests,
+        })
+
+    def totals(self) -> dict[str, int]:
+        'sums of the columns'
+        return {x: sum(row[x] for row in self.rows) for x in self.COLUMNS}
+
+    def eta(self) -> float | None:
+        'estimated seconds to translate, None without a measured throughput'
+
+        if not self.chars_per_second:
+            return None
+        return self.totals()["chars"] / self.chars_per_second
+
+    def to_json(self) -> dict:
+        'plan as json data'
+        return {
+            "backend": self.backend,
+            "files": self.rows,
+            "total": self.totals(),
+            "chars_per_second": self.chars_per_second,
+            "eta_seconds": self.eta(),
+            "warnings": self.warnings,
+        }
+
+    def print(self):
+        'print the plan as a table'
+
+        folder = None
+        for row in self.rows:
+            if row["folder"] != folder:
+                folder = row["folder"]
+                print(f"< {folder} >")
+                print(f'{"File":<24} {"Language":<8} {"Missing":>8} {"Unique":>8} {"Chars":>10} {"Requests":>8}')
+            print(f'{row["file"]:<24} {row["language"]:<8} {row["missing"]:>8} {row["unique"]:>8} {row["chars"]:>10} {row["requests"]:>8}')
+        total = self.totals()
+        print(f'\nTotal: {total["missing"]} missing keys, {total["unique"]} unique texts, '
+              f'{total["chars"]} characters, {total["requests"]} requests, {self.warnings} warnings')
+        eta = self.eta()
+        if eta is None:
+            print(f"Estimated time: unknown, no throughput measured for the {self.backend} backend yet")
+        else:
+            print(f"Estimated time: {format_duration(eta)} ({self.chars_per_second:.0f} characters per second measured with the {self.backend} backend)")
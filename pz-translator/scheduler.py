@@ -0,0 +1,166 @@
+"""
+Schedule requests to the translation backend: rate limiting, retries and adaptive concurrency
+"""
+
+import time
+import random
+import threading
+from collections import deque
+from backends import Backend, BackendError, RateLimitError
+from metrics import Metrics
+
+class RateLimiter:
+    """
+    Token bucket limiting requests per second, with a limit of requests running at the same time.
+    both limits are lowered when the service throttles requests and raised again after successful requests.
+    rate 0 starts without a limit, which is set from the observed rate at the first throttled request.
+    """
+
+    def __init__(self, rate: float = 0, concurrency: int = 1):
+        self.max_rate = rate if rate > 0 else None
+        self.rate = self.max_rate
+        self.max_concurrency = max(1, concurrency)
+        self.concurrency = self.max_concurrency
+        self.active = 0
+        self.tokens = 1.0
+        self.refilled = time.monotonic()
+        self.started = deque(maxlen=50)
+        self.successes = 0
+        self.lowered = 0.0
+        self.condition = threading.Condition()
+
+    def observed_rate(self) -> float:
+        'requests per second of the recent requests'
+
+        if len(self.started) < 2:
+            return 1.0
+        elapsed = self.started[-1] - self.started[0]
+        return (len(self.started) - 1) / elapsed if elapsed > 0 else 1.0
+
+    def acquire(self, stopping: threading.Event = None):
+        'wait for a free slot and a token'
+
+        with self.condition:
+            while True:
+                if stopping and stopping.is_set():
+                    raise KeyboardInterrupt
+                now = time.monotonic()
+                wait = 0.5
+                if self.active < self.concurrency:
+                    if self.rate is None:
+                        break
+                    self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.refilled) * self.rate)
+                    self.refilled = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        break
+                    wait = (1 - self.tokens) / self.rate
+                self.condition.wait(min(wait, 0.5))
+            self.active += 1
+            self.started.append(now)
+
+    def release(self, throttled: bool = False):
+        'free the slot and adapt the limits'
+
+        with self.condition:
+            self.active -= 1
+            if throttled:
+                self.successes = 0
+                now = time.monotonic()
+                # requests running at the same time are throttled together, lower once per second
+                if now - self.lowered >= 1.0:
+                    self.lowered = now
+                    self.rate = max(0.1, (self.rate or self.observed_rate()) / 2)
+                    self.concurrency = max(1, self.concurrency - 1)
+            else:
+                self.successes += 1
+                if self.rate is not None:
+                    # increase back towards the configured limit
+                    self.rate += max(0.1, self.rate * 0.05)
+                    if self.max_rate is not None:
+                        self.rate = min(self.rate, self.max_rate)
+                if self.successes % 10 == 0:
+                    self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+            self.condition.notify_all()
+
+class Scheduler(Backend):
+    """
+    Calls the backend through the rate limiter, retrying failed requests with exponential backoff and jitter.
+    """
+
+    def __init__(self, backend: Backend, limiter: RateLimiter, retries: int = 4, backoff: float = 1.0,
+                 max_backoff: float = 60.0, stopping: threading.Event = None, metrics: Metrics = None):
+        super().__init__(backend.source, backend.options)
+        self.backend = backend
+        self.name = backend.name
+        self.max_chars = backend.max_chars
+        self.joins_texts = backend.joins_texts
+        self.limiter = limiter
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stopping = stopping or threading.Event()
+        self.retried = 0
+        self.throttled = 0
+        self.chars = 0
+        self.metrics = metrics
+
+    @property
+    def requests(self) -> int:
+        'requests sent to the backend'
+        return self.backend.calls
+
+    def run(self, func, *args):
+        'call function with retries'
+
+        attempt = 0
+        while True:
+            self.limiter.acquire(self.stopping)
+            start = time.perf_counter()
+            try:
+                try:
+                    result = func(*args)
+                finally:
+                    if self.metrics is not None:
+                        self.metrics.add("backend", time.perf_counter() - start)
+            except RateLimitError:
+                self.limiter.release(True)
+                with self.lock:
+                    self.throttled += 1
+                if attempt >= self.retries:
+                    raise
+            except BackendError:
+                self.limiter.release()
+                if attempt >= self.retries:
+                    raise
+            except BaseException:
+                self.limiter.release()
+                raise
+            else:
+                self.limiter.release()
+                return result
+            with self.lock:
+                self.retried += 1
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+            attempt += 1
+            if self.stopping.wait(delay / 2 + random.uniform(0, delay / 2)):
+                raise KeyboardInterrupt
+
+    def count_chars(self, chars: int):
+        'count characters of translated requests'
+        with self.lock:
+            self.chars += chars
+
+    def translate(self, text: str, target: str) -> str:
+        result = self.run(self.backend.translate, text, target)
+        self.count_chars(len(text))
+        return result
+
+    def translate_batch(self, texts: list[str], target: str) -> list[str]:
+        result = self.run(self.backend.translate_batch, texts, target)
+        self.count_chars(sum(len(x) for x in texts))
+        return result
+
+    def summary(self) -> str:
+        'request counters'
+        return f"Translation requests: {self.requests}, retried: {self.retried}, throttled: {self.throttled}"
@@ -3,49 +3,348 @@ Script to process and fill mod translations for Project Zomboid
 """
 
 import os
+import io
 import sys
+import glob
+import argparse
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextlib import redirect_stdout
 from pathlib import Path
-from shutil import copyfile
+from shutil import copyfile, copymode
+from filecmp import cmp
 import json
+import hashlib
+import sqlite3
 from configparser import ConfigParser
-from deep_translator import GoogleTranslator
-from languages_info import PZ_LANGUAGES
-from translation_types import TranslateType, TRANSLATION_TYPES
-
-TAG_MODULATION = [
-    ("<", "{<{"),
-    (">", "}>}"),
-    ("%1", "{%1}"),
-    ("%2", "{%2}"),
-    ("%3", "{%3}"),
-]
-
-def tags_mod(text:str):
-    """
-    modulate special tags from changing during translation
-    """
-    for k, v in TAG_MODULATION:
-        text = text.replace(k,v)
-    return text
+from languages_info import get_pz_languages
+from batching import BatchTranslator
+from backends import create_backend
+from scheduler import Scheduler, RateLimiter
+from translation_memory import TranslationMemory
+from checkpoint import Journal
+from manifest import Manifest, Fingerprints, file_hash, text_hash
+from parse_cache import ParseCache
+from dir_index import DirectoryIndex
+from placeholders import Placeholders
+from budget import Budget
+from planner import Plan, load_throughput, save_throughput
+from metrics import Metrics, merge_reports, write_report
+from watcher import watch
+from translation_types import TranslateType, File, TranslationTemplate, TRANSLATION_TYPES
 
-def tags_demod(text:str):
+class Session:
     """
-    demodulate special tags
+    Translation session shared by the translators of a run:
+    config, backend, translation memory, texts being translated and counters.
+    the translators of a project are translated with one pool of workers.
     """
-    for k, v in TAG_MODULATION:
-        text = text.replace(v,k)
-    return text
+
+    def __init__(self, deadline: float = None, budget_chars: int = None, dry_run: bool = False, keep: bool = False,
+                 shared_chars=None):
+        """
+        deadline (time.time() timestamp) and budget_chars replace the limits in the config.
+        shared_chars counts the characters of the budget for the worker processes of a run.
+        dry_run sessions only plan, they don't create folders or files in the translate folders.
+        keep sessions run several times, parsed files are also kept in memory.
+        """
+
+        self.metrics = Metrics()
+        self.config_path = Path(__file__).parent.parent / "config.ini"
+        assert self.config_path.is_file(), f"Missing config file: {self.config_path}"
+        self.config = ConfigParser()
+        with self.metrics.time("config"):
+            self.config.read(self.config_path)
+
+        self.dry_run = dry_run
+        self.started = time.monotonic()
+        self.warnings = 0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stopping = threading.Event()
+        self.run_texts: dict[tuple[str, str], Future] = {}
+        self.batchers: list[BatchTranslator] = []
+        self.deduplicated = 0
+        self.shared = 0
+        self.skipped = 0
+        self.stale = 0
+        self.written = 0
+        self.unchanged = 0
+        self.source_lang = get_pz_languages()[self.config["Translate"]["source"]]
+        self.workers = max(1, self.config.getint("Translate","workers",fallback=1))
+        self.backend = Scheduler(
+            create_backend(self.config, self.source_lang["tr_code"]),
+            RateLimiter(
+                self.config.getfloat("Backend","rateLimit",fallback=0),
+                self.config.getint("Backend","concurrency",fallback=0) or self.workers
+            ),
+            self.config.getint("Backend","retries",fallback=4),
+            self.config.getfloat("Backend","backoff",fallback=1),
+            self.config.getfloat("Backend","maxBackoff",fallback=60),
+            self.stopping,
+            self.metrics
+        )
+        self.checkpoint_keys = self.config.getint("Translate","checkpointKeys",fallback=50)
+        self.checkpoint_seconds = self.config.getfloat("Translate","checkpointSeconds",fallback=10)
+        option = self.config.get("Translate","languagesNoShare",fallback=None)
+        self.languages_no_share = {x.strip() for x in option.split(",")} if option else set()
+        option = self.config.get("Translate","protectPatterns",fallback="",raw=True)
+        self.placeholders = Placeholders([x.strip() for x in option.splitlines() if x.strip()])
+        option = self.config.get("Directories","Cache",fallback=None)
+        self.cache_path = Path(option) if option else Path(__file__).parent.parent / ".cache"
+        self.memory = None
+        if self.config.getboolean("Translate","memory",fallback=True):
+            option = self.config.get("Directories","Memory",fallback=None)
+            try:
+                # plans only read the memory, there is none to read before the first run
+                self.memory = TranslationMemory(
+                    Path(option) if option else Path(__file__).parent.parent / "translation_memory.sqlite",
+                    self.config.getint("Translate","memoryEntries",fallback=0),
+                    self.backend.name,
+                    self.cache_path / "fuzzy",
+                    dry_run
+                )
+            except sqlite3.OperationalError:
+                if not dry_run:
+                    raise
+        self.fuzzy_threshold = self.config.getfloat("Translate","fuzzyMatch",fallback=0) if self.memory else 0
+        option = self.config.get("Directories","Review",fallback=None)
+        self.review_path = Path(option) if option else Path(__file__).parent.parent / "review"
+        # review files written in this run, they are rewritten by the next one
+        self.reviewed: set[Path] = set()
+        self.review_lock = threading.Lock()
+        self.parse_cache = None
+        if self.config.getboolean("Translate","parseCache",fallback=True):
+            self.parse_cache = ParseCache(self.cache_path / "parsed", keep, dry_run)
+        if deadline is None:
+            minutes = self.config.getfloat("Translate","deadline",fallback=0)
+            deadline = time.time() + minutes * 60 if minutes > 0 else 0
+        if budget_chars is None:
+            budget_chars = self.config.getint("Translate","budgetChars",fallback=0)
+        self.budget = Budget(deadline, budget_chars, shared_chars)
+        option = self.config.get("Translate","priority",fallback="UI, IG_UI, Tooltip, ItemName")
+        self.priority = [x.strip() for x in option.split(",") if x.strip()]
+
+    def get_batcher(self, tr_code: str) -> BatchTranslator:
+        """
+        return the batch translator of this thread for the target language code.
+        """
+
+        batchers = getattr(self.local, "batchers", None)
+        if batchers is None:
+            batchers = self.local.batchers = {}
+        batcher = batchers.get(tr_code)
+        if batcher is None:
+            batcher = batchers[tr_code] = BatchTranslator(
+                self.backend,
+                tr_code,
+                self.config.getint("Translate","batchChars",fallback=4500),
+                self.config.getint("Translate","batchItems",fallback=100)
+            )
+            with self.lock:
+                self.batchers.append(batcher)
+        return batcher
+
+    def batch_counters(self) -> tuple[int, int]:
+        'batches that fell back to single requests and texts that failed, of all threads'
+
+        with self.lock:
+            return sum(b.fallbacks for b in self.batchers), sum(b.failed for b in self.batchers)
+
+    def run(self, translators: list, close: bool = True):
+        """
+        translate the folders of the translators and print the summary of the session.
+        close the session after, unless it runs again.
+        """
+
+        self.started = time.monotonic()
+        self.reviewed = set()
+        self.translate(translators)
+        self.print_summary()
+        if close:
+            self.close()
+
+    def translate(self, translators: list):
+        'translate the folders of the translators'
+
+        try:
+            if self.workers > 1:
+                self.run_concurrent(translators)
+            else:
+                for translator in translators:
+                    for line in translator.header:
+                        print(line)
+                    translator.run_serial()
+        finally:
+            for translator in translators:
+                translator.save()
+
+    def run_buffered(self, func, *args) -> list[str]:
+        'run function and return the messages it logged'
+
+        self.local.log = []
+        try:
+            func(*args)
+            return self.local.log
+        finally:
+            self.local.log = None
+
+    def run_concurrent(self, translators: list):
+        """
+        translate (file, language group) pairs of all translators with one pool of worker threads.
+        messages are printed in the same order as a serial run.
+        """
+
+        outputs = []
+        with ThreadPoolExecutor(self.workers) as executor:
+            try:
+                jobs = []
+                for translator in translators:
+                    for output in translator.get_jobs():
+                        if isinstance(output, tuple):
+                            jobs.append((len(outputs), translator, output))
+                        outputs.append(output)
+                if self.budget.active:
+                    # most important files of all translators first, printed in the usual order
+                    jobs.sort(key=lambda x: x[1].file_priority(x[2][0]))
+                for index, translator, args in jobs:
+                    outputs[index] = executor.submit(self.run_buffered, translator.translate_group, *args)
+                while outputs:
+                    output = outputs[0]
+                    for line in output if isinstance(output, list) else output.result():
+                        print(line)
+                    outputs.pop(0)
+            except KeyboardInterrupt:
+                # let running workers save their progress
+                self.stopping.set()
+                for output in outputs:
+                    if not isinstance(output, list):
+                        output.cancel()
+                executor.shutdown(wait=True)
+                for output in outputs:
+                    if isinstance(output, list):
+                        lines = output
+                    elif output.cancelled() or output.exception() is not None:
+                        continue
+                    else:
+                        lines = output.result()
+                    for line in lines:
+                        print(line)
+                raise
+
+    def plan(self, translators: list) -> Plan:
+        """
+        return the pending work of the translators, nothing is translated.
+        messages are not printed, warnings are counted in the plan.
+        """
+
+        plan = Plan(self.backend.name, load_throughput(self.cache_path / "throughput.json", self.backend.name))
+        seen: dict[str, set[str]] = {}
+        self.local.log = []
+        try:
+            for translator in translators:
+                translator.plan(plan, seen)
+        finally:
+            self.local.log = None
+        plan.warnings = self.warnings
+        if self.memory:
+            self.memory.close()
+        return plan
+
+    def counters(self) -> dict:
+        'counters of the session for the run report'
+
+        counters = {
+            "warnings": self.warnings,
+            "requests": self.backend.requests,
+            "retried": self.backend.retried,
+            "throttled": self.backend.throttled,
+            "chars": self.backend.chars,
+            "skipped": self.skipped,
+            "stale": self.stale,
+            "written": self.written,
+            "unchanged": self.unchanged,
+            "deduplicated": self.deduplicated,
+            "shared": self.shared,
+        }
+        counters["batch_fallbacks"], counters["failed_texts"] = self.batch_counters()
+        if self.parse_cache:
+            counters["parse_cache_hits"] = self.parse_cache.hits
+            counters["parse_cache_misses"] = self.parse_cache.misses
+        if self.memory:
+            counters["memory_hits"] = self.memory.hits
+            counters["memory_misses"] = self.memory.misses
+            counters["fuzzy_matches"] = self.memory.fuzzy_hits
+        if self.budget.active:
+            counters["budget_chars"] = self.budget.chars
+            counters["budget_exhausted"] = int(self.budget.exhausted)
+        return counters
+
+    def report(self) -> dict:
+        'run report with the time of each phase and the counters'
+        return self.metrics.report(self.counters())
+
+    def print_summary(self):
+        'print counters of the session'
+
+        print(f"\nFinished with {self.warnings} warnings.")
+        if self.backend.requests:
+            print(self.backend.summary())
+        fallbacks, failed = self.batch_counters()
+        if fallbacks or failed:
+            print(f"Batches: {fallbacks} translated one text at a time, {failed} texts failed")
+        if self.skipped:
+            print(f"Unchanged: {self.skipped} translation files skipped")
+        if self.stale:
+            print(f"Changed source texts: {self.stale} retranslated")
+        if self.written or self.unchanged:
+            print(f"Translation files: {self.written} written, {self.unchanged} unchanged")
+        if self.deduplicated:
+            print(f"Duplicate texts: {self.deduplicated} translations reused")
+        if self.shared:
+            print(f"Shared between languages: {self.shared} translations reused")
+        if self.parse_cache and self.parse_cache.hits:
+            print(self.parse_cache.summary())
+        if self.budget.active:
+            print(self.budget.summary())
+        save_throughput(self.cache_path / "throughput.json", self.backend.name, self.backend.chars, time.monotonic() - self.started)
+        if self.memory and (self.memory.hits or self.memory.misses):
+            print(self.memory.summary())
+        if self.memory and self.memory.fuzzy_hits:
+            print(f"Translations of similar texts are listed for review in {self.review_path}")
+
+    def close(self):
+        'close the translation memory'
+
+        if self.memory:
+            self.memory.close()
+
+    def warn(self, message: str):
+        """print warning message"""
+        with self.lock:
+            self.warnings += 1
+        captured = getattr(self.local, "parse_warnings", None)
+        if captured is not None:
+            captured.append(message)
+        self.log(f" - Warning: {message}")
+
+    def log(self, message: str):
+        """print message, or keep it for later when running in a worker thread"""
+        buffer = getattr(self.local, "log", None)
+        if buffer is None:
+            print(message)
+        else:
+            buffer.append(message)
 
 class Translator:
     """
     Translator class for the "Translate folder"
     """
 
-    def __init__(self, translate_path: Path = None):
-        config_path = Path(__file__).parent.parent / "config.ini"
-        assert config_path.is_file(), f"Missing config file: {config_path}"
-        self.config = ConfigParser()
-        self.config.read(config_path)
+    def __init__(self, translate_path: Path = None, session: Session = None, title: str = None):
+        self.session = session if session is not None else Session()
+        self.config = self.session.config
 
         if translate_path is None:
             self.root = Path(self.config["Directories"]["Translate"])
@@ -55,20 +354,47 @@ class Translator:
         source_path = self.get_path(source)
         assert source_path.is_dir(), f"Missing source directory: {source_path}"
 
-        self.warnings = 0
-        self.source_lang = PZ_LANGUAGES[source]
-        self.languages = self.compute_languages()
-        self.files = self.compute_files()
-        self.import_path = None
-        option = self.config.get("Directories", "Import", fallback=None)
-        if option:
-            _path = Path(option).resolve()
-            if _path.is_dir():
-                self.import_path = _path
-            else:
-                self.warn(f"Import directory {_path} is not valid")
-        self.translator = GoogleTranslator(self.source_lang["tr_code"])
-        self.check_gitattributes()
+        self.metrics = self.session.metrics
+        self.lock = self.session.lock
+        self.local = self.session.local
+        self.stopping = self.session.stopping
+        self.run_texts = self.session.run_texts
+        self.backend = self.session.backend
+        self.memory = self.session.memory
+        self.placeholders = self.session.placeholders
+        self.parse_cache = self.session.parse_cache
+        self.source_lang = self.session.source_lang
+        # messages while setting up are printed with the title when the translator runs
+        self.header = [title] if title else []
+        self.changed = None
+        self.local.log = self.header
+        try:
+            with self.metrics.time("scan"):
+                self.index = DirectoryIndex(self.root)
+            with self.metrics.time("languages"):
+                self.languages = self.compute_languages()
+            with self.metrics.time("scan"):
+                self.files = self.compute_files()
+            self.import_path = None
+            option = self.config.get("Directories", "Import", fallback=None)
+            if option:
+                _path = Path(option).resolve()
+                if _path.is_dir():
+                    self.import_path = _path
+                else:
+                    self.warn(f"Import directory {_path} is not valid")
+        finally:
+            self.local.log = None
+        cache_path = self.session.cache_path
+        cache_name = f'{hashlib.sha1(str(self.root.resolve()).encode()).hexdigest()[:16]}.json'
+        self.manifest = None
+        if self.config.getboolean("Translate","incremental",fallback=True):
+            self.manifest = Manifest(cache_path / "manifests" / cache_name, file_hash(self.session.config_path))
+        self.fingerprints = None
+        if self.config.getboolean("Translate","retranslateChanged",fallback=True):
+            self.fingerprints = Fingerprints(cache_path / "fingerprints" / cache_name)
+        if not self.session.dry_run:
+            self.check_gitattributes()
 
     def get_path(self, lang_id: str, file: TranslateType = None) -> Path:
         """
@@ -89,6 +415,68 @@ class Translator:
             return None
         return self.import_path.joinpath(file.get_path(lang_id)).resolve()
 
+    def get_temp_path(self, lang_id: str, file: TranslateType) -> Path:
+        'returns the path of the file with saved auto-translations from older versions'
+
+        file_path = self.get_path(lang_id, file)
+        return file_path.parent.joinpath(f'{file_path.stem}_translator_temp.txt')
+
+    def get_journal_path(self, lang_id: str, file: TranslateType) -> Path:
+        'returns the path of the journal with saved auto-translations'
+
+        file_path = self.get_path(lang_id, file)
+        return file_path.parent.joinpath(f'{file_path.stem}_translator_journal.jsonl')
+
+    def get_review_path(self, lang_id: str, file: TranslateType) -> Path:
+        'returns the path of the list of translations reused from similar texts, outside the mod so it is not shipped'
+
+        # named after the mod of a mod translate folder
+        name = self.root.parents[3].name if self.root.parts[-4:] == ("media","lua","shared","Translate") else self.root.name
+        return self.session.review_path / name / lang_id / f'{self.get_path(lang_id, file).stem}.txt'
+
+    def write_review(self, lang_id: str, file: TranslateType, keys_by_text: dict[str, list[str]], matches: dict[str, tuple[str, str, float]]):
+        'add the translations reused from similar texts to the review file'
+
+        review_path = self.get_review_path(lang_id, file)
+        with self.session.review_lock:
+            mode = "a" if review_path in self.session.reviewed else "w"
+            self.session.reviewed.add(review_path)
+            review_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(review_path, mode, encoding="utf-8") as f:
+                for source, (match, text, score) in matches.items():
+                    f.write(f"{', '.join(keys_by_text[source])} (similarity {score:.2f})\n")
+                    f.write(f"  source: {source}\n  match:  {match}\n  text:   {text}\n\n")
+        self.log(f" - Similar texts reused: {len(matches)}, review them in {review_path}")
+
+    def get_manifest_paths(self, lang_id: str, file: TranslateType) -> dict[str, Path | None]:
+        'returns the files used to make the translation file'
+
+        return {
+            "source": self.get_path(self.source_lang["name"], file),
+            "target": self.get_path(lang_id, file),
+            "import": self.get_import_path(lang_id, file),
+            "temp": self.get_temp_path(lang_id, file),
+            "journal": self.get_journal_path(lang_id, file),
+        }
+
+    def is_unchanged(self, lang: dict, file: TranslateType) -> bool:
+        'check if the translation file is up to date with the source file'
+
+        if self.manifest is None:
+            return False
+        return self.manifest.is_unchanged(file.get_path(lang["name"]), self.get_manifest_paths(lang["name"], file), self.index.stat)
+
+    def filter_groups(self, file: TranslateType, groups: list[list[dict]]) -> list[list[dict]]:
+        'remove languages with up to date translation file from groups'
+
+        filtered = []
+        for group in groups:
+            group = [lang for lang in group if not self.is_unchanged(lang, file)]
+            if group:
+                filtered.append(group)
+        self.session.skipped += sum(len(x) for x in groups) - sum(len(x) for x in filtered)
+        return filtered
+
     def get_translation_type(self, case: str) -> type[TranslateType] | None:
         'return translation type class'
 
@@ -106,7 +494,7 @@ class Translator:
                 return _path
         else:
             _path = self.root / "TV_Radio"
-            if _path.exists():
+            if self.index.is_dir(_path):
                 return _path
         return None
 
@@ -118,28 +506,31 @@ class Translator:
         languages = []
         for lang in translate:
             lang_path = self.get_path(lang)
-            if lang_path.is_dir():
-                languages.append(PZ_LANGUAGES[lang])
+            if self.index.is_dir(lang_path):
+                languages.append(get_pz_languages()[lang])
             elif lang in create:
-                lang_path.mkdir()
-                languages.append(PZ_LANGUAGES[lang])
+                if not self.session.dry_run:
+                    lang_path.mkdir()
+                    self.index.add_dir(lang_path)
+                languages.append(get_pz_languages()[lang])
 
         return languages
 
     def compute_languages(self):
         "compute languages for translation"
 
+        pz_languages = get_pz_languages()
         option = self.config.get("Translate","languagesExclude",fallback=None)
         if option:
-            lang_exclude = {x for x in [x.strip() for x in option.split(",")] if x in PZ_LANGUAGES}
+            lang_exclude = {x for x in [x.strip() for x in option.split(",")] if x in pz_languages}
         else:
             lang_exclude = set()
         lang_exclude.add(self.source_lang["name"])
         option = self.config.get("Translate","languagesTranslate",fallback=None)
         if option:
-            lang_translate = [x for x in [x.strip() for x in option.split(",")] if x not in lang_exclude and x in PZ_LANGUAGES]
+            lang_translate = [x for x in [x.strip() for x in option.split(",")] if x not in lang_exclude and x in pz_languages]
         else:
-            lang_translate = [x for x in PZ_LANGUAGES if x not in lang_exclude]
+            lang_translate = [x for x in pz_languages if x not in lang_exclude]
         option = self.config.get("Translate","languagesCreate",fallback=None)
         if option:
             lang_create = {x for x in [x.strip() for x in option.split(",")] if x in lang_translate}
@@ -148,6 +539,23 @@ class Translator:
 
         return self.get_valid_languages(lang_translate,lang_create)
 
+    def share_code(self, lang: dict) -> str:
+        'languages with the same share code use the same translations, in the run and in the translation memory'
+
+        if lang["name"] in self.session.languages_no_share:
+            return lang["name"]
+        return lang["tr_code"]
+
+    def compute_language_groups(self) -> list[list[dict]]:
+        """
+        group languages that share translations, keeping the order of the languages.
+        """
+
+        groups = {}
+        for lang in self.languages:
+            groups.setdefault(self.share_code(lang), []).append(lang)
+        return list(groups.values())
+
     def compute_files(self) -> list[TranslateType]:
         """
         get list of source files to translate.
@@ -162,108 +570,509 @@ class Translator:
                 if tclass is None:
                     continue
                 tobj = tclass(self)
-                if self.get_path(self.source_lang["name"], tobj).is_file():
+                if self.index.is_file(self.get_path(self.source_lang["name"], tobj)):
                     files.append(tobj)
         else:
             suffix = f'_{self.source_lang["name"]}.txt'
             source_path = self.get_path(self.source_lang["name"])
-            with os.scandir(source_path) as dir_entries:
-                for each in dir_entries:
-                    if each.is_dir():
-                        for name in ["title.txt","description.txt"]:
-                            for fp in Path(each).rglob(name):
-                                tclass = self.get_translation_type("MapInfo")
-                                files.append(tclass(self,str(fp.relative_to(source_path))))
-                    elif each.name.endswith(suffix):
-                        tclass = self.get_translation_type(each.name.removesuffix(suffix))
-                        if tclass is not None:
-                            files.append(tclass(self))
-            # source_path = self.get_radio_path()
-            # if source_path:
-            #     tclass = self.get_translation_type("RadioData")
-            #     files.append(tclass(self))
+            for each in self.index.list_dir(source_path):
+                if self.index.is_dir(source_path / each):
+                    for name in ["title.txt","description.txt"]:
+                        for fp in self.index.find(source_path / each, name):
+                            tclass = self.get_translation_type("MapInfo")
+                            files.append(tclass(self,str(fp.relative_to(source_path))))
+                elif each.endswith(suffix):
+                    tclass = self.get_translation_type(each.removesuffix(suffix))
+                    if tclass is not None:
+                        files.append(tclass(self))
+            if self.get_radio_path():
+                tobj = self.get_translation_type("RadioData")(self)
+                if self.index.is_file(self.get_path(self.source_lang["name"], tobj)):
+                    files.append(tobj)
         return files
 
-    def translate_missing(self, tlang: dict, file: TranslateType, src_map: dict, tr_map: dict):
-        'translate missing texts using translators single text function'
+    def fill_saved(self, tlang: dict, file: TranslateType, src_map: dict, tr_map: dict, shared: dict, journal: Journal) -> set:
+        """
+        fill missing texts with saved auto-translations and the translations of languages in the same group.
+        returns the filled keys.
+        """
 
+        auto = set()
         #import saved auto-translations
-        file_path = self.get_path(tlang["name"], file)
-        temp_file_path = file_path.parent.joinpath(f'{file_path.stem}_translator_temp.txt')
+        temp_file_path = self.get_temp_path(tlang["name"], file)
         auto_translations = {}
-        if temp_file_path.is_file():
+        if self.index.is_file(temp_file_path):
             file.parse_translation(temp_file_path, tlang, auto_translations, True)
+        auto_translations.update(journal.read(src_map))
+        if auto_translations:
             for key, text in auto_translations.items():
-                if key not in tr_map:
-                    tr_map[key] = text 
+                if not tr_map.get(key, None):
+                    tr_map[key] = text
+                    auto.add(key)
+        #use translations of languages with the same translation code
+        if shared:
+            count = 0
+            for key in src_map:
+                if not tr_map.get(key, None) and shared.get(key, None):
+                    tr_map[key] = shared[key]
+                    auto.add(key)
+                    count += 1
+            if count:
+                self.log(f" - Shared texts: {count}")
+                with self.lock:
+                    self.session.shared += count
+        return auto
+
+    def translate_missing(self, tlang: dict, file: TranslateType, src_map: dict, tr_map: dict, shared: dict = None) -> set:
+        """
+        translate missing texts in batches of the session batch translator, one text at a time where a batch fails.
+        shared contains the translations of languages in the same group.
+        returns the keys that were auto-translated.
+        """
+
+        temp_file_path = self.get_temp_path(tlang["name"], file)
+        journal = Journal(self.get_journal_path(tlang["name"], file), self.session.checkpoint_keys, self.session.checkpoint_seconds)
+        auto = self.fill_saved(tlang, file, src_map, tr_map, shared, journal)
         #check missing and translate
         untranslated = [key for key in src_map if not tr_map.get(key, None)]
         if untranslated:
-            print(f" - Translating number of texts: {len(untranslated)}")
-            self.translator.target = tlang["tr_code"]
+            self.log(f" - Translating number of texts: {len(untranslated)}")
+            tr_code = tlang["tr_code"]
+            share_code = self.share_code(tlang)
+            keys_by_text: dict[str, list[str]] = {}
+            for key in untranslated:
+                keys_by_text.setdefault(src_map[key], []).append(key)
+            done = auto
+            def assign(source: str, text: str, save: bool = True):
+                for key in keys_by_text[source]:
+                    tr_map[key] = text
+                    done.add(key)
+                    if save:
+                        journal.add(key, source, text)
+            if self.memory:
+                with self.metrics.time("memory"):
+                    found = self.memory.get(share_code, list(keys_by_text))
+                for source, text in found.items():
+                    assign(source, text, False)
+            if self.session.fuzzy_threshold:
+                rest = [x for x, keys in keys_by_text.items() if keys[0] not in done]
+                with self.metrics.time("fuzzy"):
+                    matches = self.memory.fuzzy(share_code, rest, self.session.fuzzy_threshold, self.placeholders)
+                for source, (_, text, _) in matches.items():
+                    assign(source, text)
+                if matches:
+                    self.write_review(tlang["name"], file, keys_by_text, matches)
+            pending = [x for x, keys in keys_by_text.items() if keys[0] not in done]
+            owned, claimed = self.claim_texts(share_code, pending)
+            batcher = self.session.get_batcher(tr_code)
+            budget = self.session.budget
+            if budget.active:
+                # more texts fit in the budget when the short ones go first
+                owned.sort(key=len)
+            translated = {}
+            def finish(source: str, text: str):
+                translated[source] = text
+                self.run_texts[(share_code, source)].set_result(text)
+                assign(source, text)
+                # the other keys of the file with the same text reuse the translation
+                with self.lock:
+                    self.session.deduplicated += len(keys_by_text[source]) - 1
             try:
-                for key in untranslated:
-                    tr_map[key] = tags_demod(self.translator.translate(tags_mod(src_map[key])))
-            except KeyboardInterrupt:
-                for key in untranslated:
-                    if key not in tr_map:
-                        break
-                    auto_translations[key] = tr_map[key]
-                file.export(temp_file_path, tlang, auto_translations)
-                raise
-            except Exception:
-                self.warn("failed to translate file")
-                for key in reversed(untranslated):
-                    if key in tr_map:
+                protected = self.placeholders.protect_all(owned)
+                broken = []
+                for index, text in batcher.translate([text for text, _ in protected], budget.allow if budget.active else None):
+                    if self.stopping.is_set():
+                        raise KeyboardInterrupt
+                    text = self.placeholders.restore(text, protected[index][1])
+                    if text is None:
+                        broken.append(index)
+                    else:
+                        finish(owned[index], text)
+                #translate texts with lost or changed tags again on their own
+                if broken:
+                    self.log(f" - Tags changed in {len(broken)} texts, translating them again")
+                for index in broken:
+                    if self.stopping.is_set():
+                        raise KeyboardInterrupt
+                    if budget.active and not budget.allow(len(protected[index][0])):
                         break
+                    text = batcher.call(protected[index][0])
+                    if text is not None:
+                        text = self.placeholders.restore(text, protected[index][1])
+                    if text is not None:
+                        finish(owned[index], text)
+                for source, future in claimed.items():
+                    text = future.result()
+                    if self.stopping.is_set():
+                        raise KeyboardInterrupt
+                    if text is not None:
+                        assign(source, text)
+                        with self.lock:
+                            self.session.deduplicated += len(keys_by_text[source])
+                failed = len(owned) - len(translated)
+                if failed and budget.exhausted:
+                    self.log(f" - Budget used, {failed} texts left for the next run")
+                elif failed:
+                    self.warn(f"failed to translate {failed} texts, they will be translated in the next run")
+            except Exception as e:
+                self.warn(f"failed to translate file, translated texts are saved for the next run\nException: {e}")
+            finally:
+                self.release_texts(share_code, owned, translated)
+                if self.memory:
+                    with self.metrics.time("memory"):
+                        self.memory.put(share_code, translated)
+                try:
+                    journal.flush()
+                except OSError as e:
+                    self.warn(f"failed to write the journal of {file.name}\nException: {e}")
+            for key in untranslated:
+                if key not in done:
                     tr_map[key] = ""
-        #remove temp file
-        temp_file_path.unlink(missing_ok=True)
+        if shared is not None:
+            for key in src_map:
+                if tr_map.get(key, None):
+                    shared.setdefault(key, tr_map[key])
+        #remove saved auto-translations when done
+        if all(tr_map.get(key, None) for key, text in src_map.items() if text):
+            journal.remove()
+            if self.index.is_file(temp_file_path):
+                temp_file_path.unlink(missing_ok=True)
+                self.index.update(temp_file_path)
+        return auto
+
+    def claim_texts(self, share_code: str, sources: list[str]) -> tuple[list[str], dict[str, Future]]:
+        """
+        claim source texts to translate in this run.
+        returns the texts to translate and the futures of texts already being translated for another file.
+        """
+
+        owned = []
+        claimed = {}
+        with self.lock:
+            for source in sources:
+                future = self.run_texts.get((share_code, source))
+                if future is None:
+                    self.run_texts[(share_code, source)] = Future()
+                    owned.append(source)
+                else:
+                    claimed[source] = future
+        return owned, claimed
+
+    def release_texts(self, share_code: str, owned: list[str], translated: dict):
+        'unblock other files waiting for claimed texts that failed to translate'
 
-    def get_translations(self, source_texts: dict, tr_lang: dict, file: TranslateType) -> dict:
+        with self.lock:
+            for source in owned:
+                if source not in translated:
+                    self.run_texts.pop((share_code, source)).set_result(None)
+
+    def get_translations(self, source_texts: dict, tr_lang: dict, file: TranslateType, shared: dict = None) -> dict:
         'return dictionary with translation texts'
 
+        tr_map, fingerprints = self.read_translations(source_texts, tr_lang, file)
+        # translate missing
+        auto = self.translate_missing(tr_lang, file, source_texts, tr_map, shared)
+        if self.fingerprints:
+            self.fingerprints.set(file.get_path(tr_lang["name"]), self.compute_fingerprints(source_texts, tr_map, fingerprints, auto))
+        return tr_map
+
+    def read_translations(self, source_texts: dict, tr_lang: dict, file: TranslateType) -> tuple[dict, dict]:
+        'return the texts of the translation and import files, and the fingerprints of the auto-translations'
+
         tr_map = {}
         tr_map["__language_name__"] = tr_lang["name"]
         # add existing tranlsations
         fp = self.get_path(tr_lang["name"], file)
-        if fp.is_file():
-            file.parse_translation(fp, tr_lang, tr_map)
+        if self.index.is_file(fp):
+            self.parse_translation(file, fp, tr_lang, tr_map)
+        # retranslate auto-translations of changed source texts
+        fingerprints = self.fingerprints.get(file.get_path(tr_lang["name"])) if self.fingerprints else {}
+        self.clear_stale(source_texts, tr_map, fingerprints)
         # import translations on top
         fp = self.get_import_path(tr_lang["name"],file)
-        if fp and fp.is_file():
-            file.parse_translation(fp, tr_lang, tr_map, True)
-        # translate missing
-        self.translate_missing(tr_lang, file, source_texts, tr_map)
-        return tr_map
+        if fp and self.index.is_file(fp):
+            self.parse_translation(file, fp, tr_lang, tr_map, True)
+        return tr_map, fingerprints
+
+    def parse_cached(self, file: TranslateType, fp: Path, kind: str, parse) -> tuple:
+        """
+        return (result, mapping) of the parse function, loaded from the parse cache if the file did not change.
+        warnings of the parse are saved with the result and shown again when it is loaded.
+        """
+
+        if self.parse_cache is None:
+            return parse()
+        kind = f"{type(file).__name__}:{file.name}:{kind}"
+        signature = self.index.stat(fp)
+        if signature is None:
+            return parse()
+        cached = self.parse_cache.load(fp, kind, signature)
+        if cached is not None:
+            result, mapping, warnings = cached
+            for message in warnings:
+                self.warn(message)
+            return result, mapping
+        self.local.parse_warnings = warnings = []
+        try:
+            result, mapping = parse()
+        finally:
+            self.local.parse_warnings = None
+        self.parse_cache.store(fp, kind, signature, (result, mapping, warnings))
+        return result, mapping
+
+    def parse_source(self, file: TranslateType, fp: Path) -> tuple:
+        'return (template, mapping) of the source file'
+
+        if not isinstance(file, File):
+            with self.metrics.time("parse source"):
+                return file.parse_source(fp, self.source_lang)
+
+        def parse():
+            template, mapping = file.parse_source(fp, self.source_lang)
+            return template.segments, mapping
+
+        with self.metrics.time("parse source"):
+            template, mapping = self.parse_cached(file, fp, f'source:{self.source_lang["charset"]}', parse)
+        return TranslationTemplate(template), mapping
+
+    def parse_translation(self, file: TranslateType, fp: Path, lang: dict, mapping: dict, is_import: bool = False):
+        'add the texts of the translation file to mapping'
+
+        def parse():
+            parsed = {}
+            file.parse_translation(fp, lang, parsed, is_import)
+            return None, parsed
+
+        with self.metrics.time("parse translation"):
+            _, parsed = self.parse_cached(file, fp, f'{"import" if is_import else "translation"}:{lang["charset"]}', parse)
+        mapping.update(parsed)
 
-    def write_translation(self, lang: dict, file: TranslateType, text: str):
-        'write the translation file'
+    def clear_stale(self, source_texts: dict, tr_map: dict, fingerprints: dict):
+        """
+        remove auto-translations whose source text changed since they were translated.
+        translations that were edited after the auto-translation are kept.
+        """
+
+        count = 0
+        for key, (source_hash, translation_hash) in fingerprints.items():
+            text = tr_map.get(key, None)
+            if text and key in source_texts and source_hash != text_hash(source_texts[key]) and translation_hash == text_hash(text):
+                tr_map[key] = ""
+                count += 1
+        if count:
+            self.log(f" - Changed source texts: {count}")
+            with self.lock:
+                self.session.stale += count
+
+    def compute_fingerprints(self, source_texts: dict, tr_map: dict, fingerprints: dict, auto: set) -> dict:
+        'fingerprints of the auto-translated texts in the translation'
 
+        keys = {}
+        for key, source in source_texts.items():
+            text = tr_map.get(key, None)
+            if not text:
+                continue
+            if key in auto:
+                keys[key] = [text_hash(source), text_hash(text)]
+            elif key in fingerprints and fingerprints[key][1] == text_hash(text):
+                keys[key] = fingerprints[key]
+        return keys
+
+    def write_translation(self, lang: dict, file: TranslateType, template: TranslationTemplate, tr_map: dict) -> bool:
+        """
+        render the template with the translations into a temporary file in the language charset,
+        it replaces the translation file if the content changed, so the file is never left half written.
+        """
+
+        file_path = self.get_path(lang["name"],file)
+        temp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}.tmp")
         try:
-            with open(self.get_path(lang["name"],file),"w",encoding=lang["charset"],errors="replace") as f:
-                f.write(text)
+            with self.metrics.time("write"):
+                # folders of map files may not exist yet in the language folder
+                file_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(temp_path, "w", encoding=file.get_charset(lang), errors="replace") as f:
+                    template.render(f.write, tr_map)
+                if self.index.is_file(file_path):
+                    # compares the sizes first, then the content
+                    if cmp(temp_path, file_path, shallow=False):
+                        temp_path.unlink()
+                        with self.lock:
+                            self.session.unchanged += 1
+                        return True
+                    copymode(file_path, temp_path)
+                os.replace(temp_path, file_path)
+                self.index.update(file_path)
+            with self.lock:
+                self.session.written += 1
+            return True
         except Exception as e:
-            self.warn(f"Failed to write {lang['name']} {file.name}\nException: {e}\nText:\n{text}")
+            temp_path.unlink(missing_ok=True)
+            self.warn(f"Failed to write {lang['name']} {file.name}\nException: {e}")
+            return False
+
+    def translate_language(self, file: TranslateType, lang: dict, template, source_map: dict, shared: dict = None):
+        'translate, paste template, or remove the file for one language'
+
+        if source_map:
+            self.log(f"Begin Translation Check for: {file.name}, {lang['name']}, {lang['text']}")
+            tr_map = self.get_translations(source_map,lang,file,shared)
+            complete = all(tr_map.get(key) for key, text in source_map.items() if text)
+            complete = self.write_translation(lang,file,template,tr_map) and complete
+        elif template:
+            complete = self.write_translation(lang,file,template,{"__language_name__": lang["name"]})
+        else:
+            file_path = self.get_path(lang["name"],file)
+            file_path.unlink(missing_ok=True)
+            self.index.update(file_path)
+            complete = True
+        if self.manifest:
+            if complete:
+                self.manifest.update(file.get_path(lang["name"]), self.get_manifest_paths(lang["name"], file))
+            else:
+                self.manifest.remove(file.get_path(lang["name"]))
+
+    def translate_group(self, file: TranslateType, group: list[dict], template, source_map: dict):
+        'translate file for languages sharing translations, the first language translates and the others reuse it'
+
+        shared = {}
+        for lang in group:
+            with self.metrics.time("translate language"):
+                self.translate_language(file, lang, template, source_map, shared)
+
+    def get_files(self) -> list[TranslateType]:
+        'files in the order to translate them, by priority when the run has a budget, only the changed files when watching'
+
+        files = self.files
+        if self.changed is not None:
+            files = [x for x in files if self.get_path(self.source_lang["name"], x) in self.changed]
+        if self.session.budget.active:
+            return sorted(files, key=self.file_priority)
+        return files
+
+    def refresh(self, changed: set[Path]) -> bool:
+        """
+        scan the folder again after the source files changed, the next run translates only the changed files.
+        returns True if files of this translator changed.
+        """
+
+        source_path = self.get_path(self.source_lang["name"]).resolve()
+        changed = {x for x in changed if x.is_relative_to(source_path)}
+        if not changed:
+            return False
+        with self.metrics.time("scan"):
+            self.index = DirectoryIndex(self.root)
+            self.files = self.compute_files()
+        if source_path in changed:
+            # events were lost, check all files
+            self.changed = None
+        else:
+            self.changed = changed
+        return bool(self.get_files())
+
+    def file_priority(self, file: TranslateType) -> int:
+        'position of the file type in the priority option, files not in it come after'
+
+        for i, name in enumerate(self.session.priority):
+            tclass = TRANSLATION_TYPES.get(name, None)
+            if tclass is not None and isinstance(file, tclass):
+                return i
+        return len(self.session.priority)
+
+    def get_jobs(self) -> list:
+        """
+        parse the source files and return the outputs in print order:
+        lists of messages and (file, group, template, source_map) arguments of translate_group.
+        """
+
+        outputs = [self.header]
+        groups = self.compute_language_groups()
+        for file in self.get_files():
+            file_groups = self.filter_groups(file, groups)
+            if not file_groups:
+                continue
+            source_fp = self.get_path(self.source_lang["name"],file)
+            self.local.log = []
+            try:
+                template, source_map = self.parse_source(file, source_fp)
+            finally:
+                outputs.append(self.local.log)
+                self.local.log = None
+            for group in file_groups:
+                outputs.append((file, group, template, source_map))
+        return outputs
+
+    def run_serial(self):
+        """
+        translate the files one after another
+        """
+
+        groups = self.compute_language_groups()
+        for file in self.get_files():
+            file_groups = self.filter_groups(file, groups)
+            if not file_groups:
+                continue
+            source_fp = self.get_path(self.source_lang["name"],file)
+            template, source_map = self.parse_source(file, source_fp)
+            for group in file_groups:
+                self.translate_group(file, group, template, source_map)
+
+    def plan(self, plan: Plan, seen: dict[str, set[str]]):
+        """
+        add the pending work of the files to the plan.
+        seen has the texts planned for each share code, they are translated once in a run.
+        """
+
+        groups = self.compute_language_groups()
+        for file in self.get_files():
+            file_groups = self.filter_groups(file, groups)
+            if not file_groups:
+                continue
+            _, source_map = self.parse_source(file, self.get_path(self.source_lang["name"],file))
+            if not source_map:
+                continue
+            for group in file_groups:
+                shared = {}
+                for lang in group:
+                    self.plan_language(plan, file, lang, source_map, shared, seen)
+
+    def plan_language(self, plan: Plan, file: TranslateType, lang: dict, source_map: dict, shared: dict, seen: dict[str, set[str]]):
+        'add the pending work of one translation file, like translate_missing without translating'
+
+        tr_map, _ = self.read_translations(source_map, lang, file)
+        journal = Journal(self.get_journal_path(lang["name"], file))
+        self.fill_saved(lang, file, source_map, tr_map, shared, journal)
+        missing = [key for key in source_map if not tr_map.get(key, None)]
+        sources = list(dict.fromkeys(source_map[key] for key in missing if source_map[key].strip()))
+        if self.memory and sources:
+            found = self.memory.get(self.share_code(lang), sources, False)
+            sources = [x for x in sources if x not in found]
+        if self.session.fuzzy_threshold and sources:
+            found = self.memory.fuzzy(self.share_code(lang), sources, self.session.fuzzy_threshold, self.placeholders)
+            sources = [x for x in sources if x not in found]
+        planned = seen.setdefault(self.share_code(lang), set())
+        sources = [x for x in sources if x not in planned]
+        planned.update(sources)
+        texts = [text for text, _ in self.placeholders.protect_all(sources)]
+        requests = len(self.session.get_batcher(lang["tr_code"]).make_batches(texts))
+        # the other languages of the group reuse the texts of the first one
+        for key, text in source_map.items():
+            shared.setdefault(key, tr_map.get(key, None) or text)
+        plan.add(str(self.root), file.name, lang["name"], len(missing), len(sources), sum(len(x) for x in texts), requests)
+
+    def save(self):
+        'save the state of translated files for the next run'
+
+        if self.manifest:
+            self.manifest.save()
+        if self.fingerprints:
+            self.fingerprints.save()
 
     def translate_main(self):
         """
         translate class instance
         """
 
-        for file in self.files:
-            source_fp = self.get_path(self.source_lang["name"],file)
-            template, source_map = file.parse_source(source_fp, self.source_lang)
-            for lang in self.languages:
-                # translate, paste template, or remove.
-                if source_map:
-                    print(f"Begin Translation Check for: {file.name}, {lang['name']}, {lang['text']}")
-                    self.write_translation(lang,file,template.safe_substitute(self.get_translations(source_map,lang,file)))
-                elif template:
-                    self.write_translation(lang,file,template)
-                else:
-                    self.get_path(lang["name"],file).unlink(missing_ok=True)
-        print(f"\nFinished with {self.warnings} warnings.")
+        self.session.run([self])
 
     def translate_specific(self, languages: list | dict, files: list, languages_create: set[str]):
         """
@@ -286,12 +1095,17 @@ class Translator:
             files = self.files
         for lang in languages:
             for file in files:
+                if file.get_charset(lang) != lang["charset"]:
+                    # files with their own charset, like the utf-8 RadioData xml, are not in the language charset
+                    continue
                 file_path = self.get_path(lang["name"],file)
-                if file_path.is_file():
-                    with open(file_path, "r", encoding=read[lang["name"]], errors=errors) as f:
-                        text = f.read()
-                    with open(file_path, "w", encoding=lang["charset"], errors=errors) as f:
-                        f.write(text)
+                if self.index.is_file(file_path):
+                    with self.metrics.time("reencode"):
+                        with open(file_path, "r", encoding=read[lang["name"]], errors=errors) as f:
+                            text = f.read()
+                        with open(file_path, "w", encoding=lang["charset"], errors=errors) as f:
+                            f.write(text)
+                        self.index.update(file_path)
 
     def reencode_initial(self):
         '''
@@ -300,7 +1114,7 @@ class Translator:
         '''
 
         self.reencode_translations(
-            { lang["name"]: lang["charset"] for lang in PZ_LANGUAGES.values() },
+            { lang["name"]: lang["charset"] for lang in get_pz_languages().values() },
             [self.source_lang] + self.languages,
             self.files
         )
@@ -321,57 +1135,297 @@ class Translator:
 
     def warn(self, message: str):
         """print warning message"""
-        self.warnings += 1
-        print(f" - Warning: {message}")
+        self.session.warn(message)
 
-def try_translate_project(root: Path) -> bool:
-    'translate project'
+    def log(self, message: str):
+        """print message, or keep it for later when running in a worker thread"""
+        self.session.log(message)
 
-    if root.joinpath("project.json").is_file():
-        print(f"< Translating project: {root.name} >")
-        r = False
-        with open(root.joinpath("project.json"),"r",encoding="utf-8") as f:
-            project = json.load(f)
-        exclude = project.get("workshop",{}).get("excludes",[])
-        for mod_id in project.get("mods",[]):
-            if mod_id in exclude:
-                continue
-            r = try_translate_mod(root / mod_id) or r
-        return r
-    return False
+def get_project_mods(root: Path) -> list[Path] | None:
+    'return the mod folders of the project, None if the folder is not a project'
 
-def try_translate_mod(root: Path) -> bool:
-    'translate mod'
+    if not root.joinpath("project.json").is_file():
+        return None
+    with open(root.joinpath("project.json"),"r",encoding="utf-8") as f:
+        project = json.load(f)
+    exclude = project.get("workshop",{}).get("excludes",[])
+    return [root / mod_id for mod_id in project.get("mods",[]) if mod_id not in exclude]
+
+def create_mod_translator(root: Path, session: Session) -> Translator | None:
+    'return translator of the mod, None if the folder is not a mod with translations'
 
     if root.joinpath("mod.info").is_file():
-        print(f"< Translating mod: {root.name} >")
+        title = f"< Translating mod: {root.name} >"
         translate_path = root.joinpath("media","lua","shared","Translate")
         if translate_path.is_dir():
-            Translator(translate_path).translate_main()
-            return True
+            return Translator(translate_path, session, title)
+        print(title)
         print("Invalid mod translation dir: ",translate_path)
-    return False
+    return None
 
-def main():
-    'main'
+def create_translators(root: Path, session: Session) -> list[Translator] | None:
+    'return translators of the project, mod or translate folder, None if the folder is not valid'
 
-    if len(sys.argv) == 1:
+    if not root.is_dir():
+        print(f"Directory {root} does not exist:")
+        return None
+    mods = get_project_mods(root)
+    if mods is not None:
+        print(f"< Translating project: {root.name} >")
+        translators = [create_mod_translator(mod_path, session) for mod_path in mods]
+        return [x for x in translators if x is not None]
+    translator = create_mod_translator(root, session)
+    if translator is None:
+        translator = Translator(root, session, "< Translating directory >")
+    return [translator]
+
+def translate_roots(roots: list[Path], mods_only: bool = False, limits: dict = None) -> tuple[dict, int]:
+    """
+    translate the folders in one session, mods_only is used for the mods of a project.
+    limits are the deadline and budget_chars arguments of the session.
+    returns (run report, failed folders)
+    """
+
+    session = Session(**(limits or {}))
+    translators, failed = collect_translators(roots, session, mods_only)
+    session.run(translators)
+    return session.report(), failed
+
+def collect_translators(roots: list[Path], session: Session, mods_only: bool = False) -> tuple[list[Translator], int]:
+    """
+    return the translators of the folders and the number of folders that failed.
+    """
+
+    translators = []
+    failed = 0
+    for root in roots:
+        try:
+            if mods_only:
+                found = [x for x in [create_mod_translator(root, session)] if x is not None]
+            else:
+                found = create_translators(root, session)
+        except Exception as e:
+            print(f"Failed to translate {root}\nException: {e}")
+            found = None
+        if found is None:
+            failed += 1
+        else:
+            translators.extend(found)
+    return translators, failed
+
+def plan_roots(roots: list[Path] | None, as_json: bool) -> int:
+    """
+    print the pending work of the folders, or the folder of the config file if roots is None.
+    returns the number of folders that failed.
+    """
+
+    session = Session(dry_run=True)
+    # folder messages would break the json output
+    with redirect_stdout(sys.stderr if as_json else sys.stdout):
+        if roots is None:
+            translators, failed = [Translator(session=session)], 0
+        else:
+            translators, failed = collect_translators(roots, session)
+    plan = session.plan(translators)
+    if as_json:
+        print(json.dumps(plan.to_json(), indent=1))
+    else:
+        plan.print()
+    return failed
+
+def watch_roots(roots: list[Path] | None, debounce: float, poll: bool) -> int:
+    """
+    translate the folders, or the folder of the config file if roots is None, then translate the changed files
+    each time source files are saved, until interrupted.
+    the session stays open, so the backend, translation memory and parsed files are ready for each change.
+    returns the number of folders that failed.
+    """
+
+    session = Session(keep=True)
+    failed = 0
+    try:
+        if roots is None:
+            translators, failed = [Translator(session=session)], 0
+        else:
+            translators, failed = collect_translators(roots, session)
+        session.run(translators, False)
+        folders = [x.get_path(session.source_lang["name"]).resolve() for x in translators]
+        print(f"\nWatching {len(folders)} folders for changes, press Ctrl+C to stop")
+        for changed in watch(folders, debounce, poll):
+            started = time.monotonic()
+            before = session.counters()
+            try:
+                changed_translators = [x for x in translators if x.refresh(changed)]
+                if not changed_translators:
+                    continue
+                print(f"\nChanged: {', '.join(sorted(x.name for x in changed))}")
+                session.translate(changed_translators)
+            except Exception as e:
+                # a file saved halfway is read again on the next save
+                session.warn(f"failed to translate the changes, watching for the next ones\nException: {e}")
+            counters = {key: value - before.get(key, 0) for key, value in session.counters().items()}
+            print(f"Updated in {time.monotonic() - started:.2f}s: {counters['written']} files written, "
+                  f"{counters['requests']} requests, {counters['warnings']} warnings")
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+    finally:
+        session.close()
+    return failed
+
+# characters of the budget sent by all worker processes, set when a worker starts
+job_chars = None
+
+def init_job(chars):
+    'keep the shared budget characters in a worker process'
+
+    global job_chars
+    job_chars = chars
+
+def translate_job(root: Path, mods_only: bool, limits: dict = None) -> tuple[str, dict | None, int]:
+    """
+    translate one folder in a worker process.
+    returns (printed output, run report, failed folders)
+    """
+
+    output = io.StringIO()
+    with redirect_stdout(output):
+        try:
+            report, failed = translate_roots([root], mods_only, dict(limits or {}, shared_chars=job_chars))
+        except Exception as e:
+            print(f"Failed to translate {root}\nException: {e}")
+            report, failed = None, 1
+    return output.getvalue(), report, failed
+
+def expand_roots(paths: list[str]) -> tuple[list[Path], int]:
+    """
+    resolve folder paths, expanding glob patterns, each folder once.
+    returns (folders, number of patterns without matches)
+    """
+
+    roots = []
+    missing = 0
+    for path in paths:
+        matches = sorted(glob.glob(path)) if glob.has_magic(path) else [path]
+        if not matches:
+            print(f"No folders match {path}")
+            missing += 1
+        for match in matches:
+            root = Path(match).resolve()
+            if root not in roots:
+                roots.append(root)
+    return roots, missing
+
+def run_jobs(roots: list[Path], jobs: int, limits: dict = None) -> tuple[dict, int]:
+    """
+    translate folders in worker processes, the mods of projects separately.
+    the character budget is shared by the processes, the deadline is the same for all.
+    output of each folder is printed in order when it is done.
+    returns (combined run report, failed folders)
+    """
+
+    started = time.monotonic()
+    units = []
+    for root in roots:
+        mods = get_project_mods(root) if root.is_dir() else None
+        if mods is None:
+            units.append((root, False))
+        else:
+            print(f"< Translating project: {root.name} >")
+            units.extend((x, True) for x in mods)
+    reports = []
+    failed = 0
+    if units:
+        # imports multiprocessing, only needed with --jobs
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        chars = multiprocessing.Value("q", 0)
+        with ProcessPoolExecutor(min(jobs, len(units)), initializer=init_job, initargs=(chars,)) as executor:
+            for output, report, job_failed in executor.map(translate_job, *zip(*units), [limits] * len(units)):
+                print(output, end="")
+                if report is not None:
+                    reports.append(report)
+                failed += job_failed
+    report = merge_reports(reports, time.monotonic() - started)
+    print(f"\nFinished {len(units)} folders with {report['counters'].get('warnings', 0)} warnings, {failed} failed.")
+    return report, failed
+
+def main() -> int:
+    """
+    translate the folders given on the command line, or the folder of the config file.
+    returns the exit status: 1 if a folder failed, or had warnings with --strict.
+    """
+
+    parser = argparse.ArgumentParser(description="Fill mod translations for Project Zomboid")
+    parser.add_argument("paths", nargs="*", help="translate, mod or project folders, glob patterns are expanded")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="folders translated at the same time in worker processes, mods of projects are translated separately")
+    parser.add_argument("--strict", action="store_true", help="exit with status 1 when there are warnings")
+    parser.add_argument("--deadline", type=float, metavar="MINUTES",
+                        help="stop sending texts for translation after this many minutes, most important files first")
+    parser.add_argument("--budget", type=int, metavar="CHARS",
+                        help="stop sending texts for translation after this many characters, most important files first")
+    parser.add_argument("--plan", action="store_true",
+                        help="only report the missing texts, characters, requests and estimated time of each file")
+    parser.add_argument("--json", action="store_true", help="print the plan as json")
+    parser.add_argument("--report", metavar="FILE",
+                        help="write the time of each phase and the counters of the run to a json or csv (.csv) file")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and translate the changed files each time source files are saved")
+    parser.add_argument("--debounce", type=float, default=0.3, metavar="SECONDS",
+                        help="with --watch, wait until there were no changes for this long before translating")
+    parser.add_argument("--poll", action="store_true",
+                        help="with --watch, check the files for changes every second instead of using inotify")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="profile the run with cProfile and save the stats, worker threads are not included")
+    args = parser.parse_args()
+
+    if not args.profile:
+        return run_command(args)
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return run_command(args)
+    finally:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+
+def run_command(args: argparse.Namespace) -> int:
+    'run the command line arguments, returns the exit status'
+
+    limits = {}
+    if args.deadline is not None:
+        limits["deadline"] = time.time() + args.deadline * 60 if args.deadline > 0 else 0
+    if args.budget is not None:
+        limits["budget_chars"] = args.budget
+    # patterns without matches count as failed folders
+    roots, failed = expand_roots(args.paths) if args.paths else (None, 0)
+    if args.plan:
+        failed += plan_roots(roots, args.json)
+        return 1 if failed else 0
+    if args.watch:
+        if roots == []:
+            return 1
+        failed += watch_roots(roots, args.debounce, args.poll)
+        return 1 if failed else 0
+    if roots is None:
         print("< Translating from config file >")
-        Translator().translate_main()
+        translator = Translator(session=Session(**limits))
+        translator.translate_main()
+        report, failed = translator.session.report(), 0
     else:
-        root = Path(sys.argv[1]).resolve()
-        if not root.is_dir():
-            print(f"Directory {root} does not exist:")
-        elif try_translate_project(root):
-            return
-        elif try_translate_mod(root):
-            return
+        if args.jobs > 1:
+            report, job_failed = run_jobs(roots, args.jobs, limits)
         else:
-            print("< Translating directory >")
-            Translator(root).translate_main()
+            report, job_failed = translate_roots(roots, False, limits)
+        failed += job_failed
+    if args.report:
+        write_report(Path(args.report), report)
+    return 1 if failed or args.strict and report["counters"].get("warnings", 0) else 0
 
 if __name__ == '__main__':
     try:
-        main()
+        sys.exit(main())
     except KeyboardInterrupt:
         print("\nInterrupted by user")
+        sys.exit(130)
@@ -0,0 +1,279 @@
+"""
+Persistent translation memory, stores translated texts by backend, source text and target language code
+"""
+
+import sys
+import time
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from fuzzy_index import FuzzyIndex
+from placeholders import Placeholders
+
+class TranslationMemory:
+    """
+    SQLite store of translations keyed by (backend, source text, target tr_code),
+    so the texts of the local and http stand-ins are never reused by google runs.
+    the least recently used entries are evicted when there are more than max_entries.
+    similar texts are found with a fuzzy index per tr_code, loaded when it is first used.
+    indexes are saved in index_folder and only the texts added since are read from the memory,
+    they are made again when texts were replaced or removed.
+    a read_only memory is opened for plans, it must exist and is never changed.
+    """
+
+    def __init__(self, path: Path, max_entries: int = 0, backend: str = "google", index_folder: Path = None,
+                 read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self.backend = backend
+        self.index_folder = index_folder
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.fuzzy_hits = 0
+        self.fuzzy_indexes: dict[str, FuzzyIndex] = {}
+        # texts put while the index of their tr_code is loaded
+        self.fuzzy_pending: dict[str, list[tuple[str, str]]] = {}
+        self.fuzzy_loading: dict[str, threading.Lock] = {}
+        # the fuzzy indexes have their own lock, loading one doesn't block get and put
+        self.fuzzy_lock = threading.Lock()
+        self.lock = threading.Lock()
+        if read_only:
+            self.db = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+            if "backend" not in [x[1] for x in self.db.execute("PRAGMA table_info(memory)")]:
+                self.db.close()
+                raise sqlite3.OperationalError(f"no translation memory of this version in {path}")
+            return
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        columns = [x[1] for x in self.db.execute("PRAGMA table_info(memory)")]
+        if columns and "backend" not in columns:
+            # memories of older versions have google translations only
+            self.db.execute("ALTER TABLE memory RENAME TO memory_old")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS memory (
+            backend TEXT NOT NULL,
+            tr_code TEXT NOT NULL,
+            source TEXT NOT NULL,
+            text TEXT NOT NULL,
+            used REAL NOT NULL,
+            PRIMARY KEY (backend, tr_code, source)
+        )""")
+        if columns and "backend" not in columns:
+            self.db.execute("INSERT INTO memory SELECT 'google', tr_code, source, text, used FROM memory_old")
+            self.db.execute("DROP TABLE memory_old")
+        self.db.execute("CREATE INDEX IF NOT EXISTS memory_used ON memory (used)")
+        self.db.commit()
+
+    def get(self, tr_code: str, sources: list[str], touch: bool = True) -> dict[str, str]:
+        'return found translations for the source texts, touch marks them as used'
+
+        found = {}
+        unique = list(dict.fromkeys(sources))
+        with self.lock:
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i+500]
+                rows = self.db.execute(
+                    f"SELECT source, text FROM memory WHERE backend = ? AND tr_code = ? AND source IN ({','.join('?' * len(chunk))})",
+                    [self.backend, tr_code, *chunk]
+                )
+                found.update(rows)
+            if found and touch:
+                self.db.executemany("UPDATE memory SET used = ? WHERE backend = ? AND tr_code = ? AND source = ?",
+                                    [(time.time(), self.backend, tr_code, source) for source in found])
+                self.db.commit()
+            self.hits += sum(1 for x in sources if x in found)
+            self.misses += sum(1 for x in sources if x not in found)
+        return found
+
+    def put(self, tr_code: str, texts: dict[str, str]):
+        'store translations of source texts'
+
+        if not texts:
+            return
+        now = time.time()
+        with self.lock:
+            self.db.executemany("INSERT OR REPLACE INTO memory (backend, tr_code, source, text, used) VALUES (?, ?, ?, ?, ?)",
+                                [(self.backend, tr_code, source, text, now) for source, text in texts.items() if source and text])
+            self.db.commit()
+        with self.fuzzy_lock:
+            index = self.fuzzy_indexes.get(tr_code)
+            pending = self.fuzzy_pending.get(tr_code)
+            for source, text in texts.items():
+                if source and text:
+                    if index is not None:
+                        index.add(source, text)
+                    elif pending is not None:
+                        pending.append((source, text))
+
+    def index_path(self, tr_code: str) -> Path | None:
+        'saved fuzzy index of the tr_code'
+        return self.index_folder / f"{self.backend}_{tr_code}.bin" if self.index_folder else None
+
+    def index_state(self, db: sqlite3.Connection, tr_code: str, last: int = None) -> tuple[int, int, list | None]:
+        """
+        last rowid, number of texts of the tr_code up to last and the text of the last row.
+        sqlite gives the rowid of a removed last row to the next text, so a changed last row means the texts changed.
+        """
+
+        query = "SELECT MAX(rowid), COUNT(*) FROM memory WHERE backend = ? AND tr_code = ?"
+        if last is None:
+            row = db.execute(query, (self.backend, tr_code)).fetchone()
+        else:
+            row = db.execute(query + " AND rowid <= ?", (self.backend, tr_code, last)).fetchone()
+        text = db.execute("SELECT source, text FROM memory WHERE rowid = ?", (row[0],)).fetchone() if row[0] else None
+        return row[0] or 0, row[1], list(text) if text else None
+
+    def load_index(self, tr_code: str, placeholders: Placeholders) -> FuzzyIndex:
+        'load the saved index of the tr_code and add the texts put since, or make it from the memory'
+
+        path = self.index_path(tr_code)
+        saved = FuzzyIndex.load(path, placeholders) if path else None
+        # a connection of its own, reading doesn't wait for the lock of the memory
+        db = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            last = 0
+            if saved is not None:
+                index, state = saved
+                last = state[0]
+                # texts were replaced or removed since it was saved
+                if self.index_state(db, tr_code, last) != tuple(state):
+                    saved = None
+                    last = 0
+            if saved is None:
+                index = FuzzyIndex(placeholders)
+                index.changed = True
+            # read in chunks, an open read blocks the commits of the memory
+            while True:
+                rows = db.execute("SELECT rowid, source, text FROM memory WHERE backend = ? AND tr_code = ? AND rowid > ? ORDER BY rowid LIMIT 5000",
+                                  (self.backend, tr_code, last)).fetchall()
+                if not rows:
+                    break
+                for last, source, text in rows:
+                    index.add(source, text)
+        finally:
+            db.close()
+        return index
+
+    def fuzzy_index(self, tr_code: str, placeholders: Placeholders) -> FuzzyIndex:
+        'fuzzy index of the tr_code, loaded once while the other languages keep using the memory'
+
+        with self.fuzzy_lock:
+            index = self.fuzzy_indexes.get(tr_code)
+            if index is not None:
+                return index
+            loading = self.fuzzy_loading.setdefault(tr_code, threading.Lock())
+        with loading:
+            with self.fuzzy_lock:
+                index = self.fuzzy_indexes.get(tr_code)
+                if index is not None:
+                    return index
+                self.fuzzy_pending[tr_code] = []
+            index = self.load_index(tr_code, placeholders)
+            with self.fuzzy_lock:
+                for source, text in self.fuzzy_pending.pop(tr_code):
+                    index.add(source, text)
+                self.fuzzy_indexes[tr_code] = index
+        return index
+
+    def fuzzy(self, tr_code: str, sources: list[str], threshold: float, placeholders: Placeholders) -> dict[str, tuple[str, str, float]]:
+        'return translations of similar texts for the source texts: {source: (matched source, translation, similarity)}'
+
+        index = self.fuzzy_index(tr_code, placeholders)
+        found = {}
+        for source in dict.fromkeys(sources):
+            with self.fuzzy_lock:
+                match = index.search(source, threshold)
+            if match is not None:
+                found[source] = match
+        with self.lock:
+            self.fuzzy_hits += len(found)
+        return found
+
+    def save_indexes(self):
+        'save the fuzzy indexes that changed, with the state of the memory they include'
+
+        with self.fuzzy_lock:
+            for tr_code, index in self.fuzzy_indexes.items():
+                path = self.index_path(tr_code)
+                if path is None or not index.changed:
+                    continue
+                with self.lock:
+                    state = self.index_state(self.db, tr_code)
+                index.dump(path, state)
+                index.changed = False
+
+    def count(self) -> int:
+        'number of entries'
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+
+    def evict(self):
+        'remove least recently used entries above the limit'
+
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            removed = self.db.execute("""SELECT backend, tr_code, source FROM memory WHERE rowid IN (
+                SELECT rowid FROM memory ORDER BY used DESC LIMIT -1 OFFSET ?
+            )""", (self.max_entries,)).fetchall()
+            self.db.execute("""DELETE FROM memory WHERE rowid IN (
+                SELECT rowid FROM memory ORDER BY used DESC LIMIT -1 OFFSET ?
+            )""", (self.max_entries,))
+            self.db.commit()
+        with self.fuzzy_lock:
+            for backend, tr_code, source in removed:
+                index = self.fuzzy_indexes.get(tr_code)
+                if index is not None and backend == self.backend:
+                    index.remove(source)
+
+    def export(self, fp: Path):
+        'write the translations of the backend to a json file: {tr_code: {source: text}}'
+
+        data = {}
+        with self.lock:
+            for tr_code, source, text in self.db.execute("SELECT tr_code, source, text FROM memory WHERE backend = ? ORDER BY tr_code, source", (self.backend,)):
+                data.setdefault(tr_code, {})[source] = text
+        with open(fp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+
+    def import_file(self, fp: Path) -> int:
+        'add translations from a json file written by export, returns number of entries'
+
+        with open(fp, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for tr_code, texts in data.items():
+            self.put(tr_code, texts)
+        return sum(len(x) for x in data.values())
+
+    def summary(self) -> str:
+        'hit and miss counters'
+
+        text = f"Translation memory: {self.hits} hits, {self.misses} misses"
+        if self.fuzzy_hits:
+            text += f", {self.fuzzy_hits} similar texts reused"
+        return text
+
+    def close(self):
+        'apply the size limit, save the fuzzy indexes and close the database'
+        if not self.read_only:
+            self.evict()
+            self.save_indexes()
+        with self.lock:
+            self.db.close()
+
+def main():
+    'import or export the translation memory: translation_memory.py <database> (import|export) <json file> [backend]'
+
+    if len(sys.argv) not in (4, 5) or sys.argv[2] not in ("import", "export"):
+        print("usage: translation_memory.py <database> (import|export) <json file> [backend, default google]")
+        return
+    memory = TranslationMemory(Path(sys.argv[1]), backend=sys.argv[4] if len(sys.argv) == 5 else "google")
+    if sys.argv[2] == "export":
+        memory.export(Path(sys.argv[3]))
+        print(f"Exported {memory.count()} entries")
+    else:
+        print(f"Imported {memory.import_file(Path(sys.argv[3]))} entries")
+    memory.close()
+
+if __name__ == '__main__':
+    main()
@@ -2,15 +2,72 @@
 File Specific Classes
 """
 
+import os
+import re
 from pathlib import Path
-from string import Template
 from io import StringIO
-from typing import Tuple
+from typing import Tuple, Callable
 
-class TranslationTemplate(Template):
-    'Custom Template'
-    idpattern = Template.delimiter
-    braceidpattern = r'([^}]*)'
+# `key = "text",` line with a single quoted text: key, before quote, text, after quote
+KEY_LINE = re.compile(r'([^="]*)=([^"]*)"([^"]*)"([^"]*)\Z', re.S)
+
+class TranslationTemplate:
+    """
+    Compiled template: segments are literal texts with the keys between them, [text, key, text, ..., text].
+    it is rendered straight into the output stream, so the same template is used for every language
+    without building the whole file as a string.
+    """
+
+    __slots__ = ("segments",)
+
+    def __init__(self, segments: list[str]):
+        self.segments = segments
+
+    def render(self, write: Callable[[str], object], mapping: dict):
+        'write the template with the texts of mapping, keys missing from mapping are written as ${key}'
+
+        segments = self.segments
+        get = mapping.get
+        write(segments[0])
+        for i in range(1, len(segments), 2):
+            key = segments[i]
+            text = get(key)
+            write("${" + key + "}" if text is None else text)
+            write(segments[i + 1])
+
+    def substitute(self, mapping: dict) -> str:
+        'rendered template as a string'
+
+        parts = []
+        self.render(parts.append, mapping)
+        return "".join(parts)
+
+class TemplateBuilder:
+    """
+    collects the segments of a template while parsing.
+    keys are written between lone surrogates, which strictly decoded files can't have, and split out at the end.
+    """
+
+    SEPARATOR = "\udfff"
+
+    def __init__(self):
+        self.buffer = StringIO()
+        self.write = self.buffer.write
+        self.keys = 0
+
+    def add_key(self, key: str):
+        'add a key replaced by its text when rendering'
+        self.keys += 1
+        self.write(f"{self.SEPARATOR}{key}{self.SEPARATOR}")
+
+    def build(self) -> TranslationTemplate:
+        'the finished template'
+
+        segments = self.buffer.getvalue().split(self.SEPARATOR)
+        self.buffer.close()
+        if len(segments) != self.keys * 2 + 1:
+            raise ValueError("separator character in the file")
+        return TranslationTemplate(segments)
 
 class TranslateType():
     "Base class"
@@ -34,19 +91,9 @@ class TranslateType():
         "read translation file"
         raise NotImplementedError()
 
-    def add_to_template(self, template: StringIO, text: str = None, is_key: bool = False, replace: list = None):
-        "add to template"
-
-        if template is None:
-            return
-        if is_key:
-            template.write("${"+text+"}")
-        else:
-            text = text.replace("$","$$")
-            if replace:
-                for k,v in replace:
-                    text = text.replace(k,v)
-            template.write(text)
+    def get_charset(self, lang: dict) -> str:
+        "charset of the file for language"
+        return lang["charset"]
 
     def export(self, fp: Path, language: dict, texts: dict):
         'write the translations from dictionary'
@@ -69,11 +116,17 @@ class File(TranslateType):
 
     def parse_file(self, fp: str, lang: dict, mapping: dict, create_template: bool, check_duplicate: bool) -> TranslationTemplate:
         """
-        parse the translation file
-        concatenation: join and format lines.
+        parse the translation file in one pass over the lines.
+        simple `key = "text",` lines and lines without texts are handled by a compiled pattern,
+        other lines (concatenation: join and format lines) by the line state machine.
         """
 
-        template = StringIO() if create_template else None
+        template = TemplateBuilder() if create_template else None
+        write = template.write if template else None
+        add_key = template.add_key if template else None
+        warn = self.parent.warn
+        prefixes = tuple(self.PREFIXES)
+        key_line = KEY_LINE.match
 
         with open(fp,'r',encoding=lang["charset"]) as f:
             key = ""
@@ -82,13 +135,50 @@ class File(TranslateType):
             lines = None
 
             line = f.readline()
-            self.add_to_template(template, line, False, [("_" + lang["name"], "_${__language_name__}")])
+            if write:
+                parts = line.split("_" + lang["name"])
+                write(parts[0])
+                for part in parts[1:]:
+                    write("_")
+                    add_key("__language_name__")
+                    write(part)
 
             for line in f:
+                if not concat:
+                    # single line key or template line
+                    match = key_line(line)
+                    if match:
+                        name, _, value, tail = match.groups()
+                        if ".." not in tail or not tail.rstrip().endswith(".."):
+                            name = name.strip()
+                            if prefixes and not name.startswith(prefixes):
+                                warn(f'Possibly misspelled key: {name}')
+                            if "{" in name:
+                                name = name.replace("{","}")
+                            if check_duplicate and name in mapping:
+                                warn(f'Duplicate key: {name}')
+                            if not name:
+                                warn("No key in:\n" + line)
+                                if write:
+                                    write(line)
+                            else:
+                                if write:
+                                    write(line[:match.end(2)+1])
+                                    add_key(name)
+                                    write(line[match.start(4)-1:])
+                                if not value:
+                                    warn(f'{name} is missing translation')
+                                mapping[name] = value
+                            continue
+                    elif ".." not in line and not ("=" in line and '"' in line):
+                        if write:
+                            write(line)
+                        continue
+
                 stripped = line.strip()
                 if "=" in stripped and "\"" in stripped:
                     if concat:
-                        self.parent.warn(f'Concat interrupted for {key}')
+                        warn(f'Concat interrupted for {key}')
                         mapping[key] = mapping.get(key,"")
                     index1 = line.index("=")
                     index2 = line.index("\"",index1+1)
@@ -97,8 +187,8 @@ class File(TranslateType):
                     text = line[index2+1:index3]
                     if ".." in stripped:
                         concat = True
-                    if self.PREFIXES and not any(key.startswith(pre) for pre in self.PREFIXES):
-                        self.parent.warn(f'Possibly misspelled key: {key}')
+                    if prefixes and not key.startswith(prefixes):
+                        warn(f'Possibly misspelled key: {key}')
                     #TODO apply replace for improved support
                     # for prefix in ["Recipe_", "DisplayName_", "DisplayName", "EvolvedRecipeName_", "ItemName_"]:
                     #     if key.startswith(prefix):
@@ -109,13 +199,13 @@ class File(TranslateType):
                     # fix for format
                     key = key.replace("{","}")
                     if check_duplicate and key in mapping:
-                        self.parent.warn(f'Duplicate key: {key}')
+                        warn(f'Duplicate key: {key}')
                     if not key:
-                        self.parent.warn("No key in:\n" + line)
-                    else:
-                        self.add_to_template(template, line[:index2+1])
-                        self.add_to_template(template, key, True)
-                        self.add_to_template(template, line[index3:])
+                        warn("No key in:\n" + line)
+                    elif write:
+                        write(line[:index2+1])
+                        add_key(key)
+                        write(line[index3:])
                 elif stripped and "--" not in stripped and (stripped.endswith("..") or concat):
                     if concat and '"' in stripped:
                         text = stripped[stripped.index("\"")+1:stripped.rindex("\"")]
@@ -139,22 +229,20 @@ class File(TranslateType):
                     lines = None
                 if key:
                     if not text:
-                        self.parent.warn(f'{key} is missing translation')
+                        warn(f'{key} is missing translation')
                     # set text to mapping
                     mapping[key] = text
-                else:
-                    self.add_to_template(template,line)
+                elif write:
+                    write(line)
 
                 key = ""
                 text = ""
                 concat = False
 
         if template:
-            text = template.getvalue()
-            template.close()
-            return TranslationTemplate(text)
+            return template.build()
         return None
-    
+
     def export(self, fp: Path, language: dict, texts: dict):
         texts.pop("__language_name__", None)
         lines = "\n".join([f'    {key} = "{text}",' for key, text in texts.items()])
@@ -284,7 +372,7 @@ class MapInfo(TranslateType): #TODO test
 
     def parse_source(self, fp: Path, lang: dict) -> Tuple[TranslationTemplate, dict]:
         with open(fp,"r",encoding=lang["charset"]) as f:
-            return "{text}", {"text": f.read()}
+            return TranslationTemplate(["", "text", ""]), {"text": f.read()}
 
     def parse_translation(self, fp: Path, lang: dict, mapping: dict, is_import: bool = False):
         with open(fp,"r",encoding=lang["charset"]) as f:
@@ -294,6 +382,160 @@ class MapInfo(TranslateType): #TODO test
         with open(fp, "w", encoding=language["charset"], errors="replace") as file:
             file.write(texts["text"])
 
+def xml_escape(text: str, quote: bool = False, breaks: bool = False) -> str:
+    'escape text for xml, quote for attribute values, breaks writes line breaks as character references'
+
+    text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    if quote:
+        text = text.replace('"', "&quot;").replace("\t", "&#9;")
+    if quote or breaks:
+        text = text.replace("\r", "&#13;").replace("\n", "&#10;")
+    return text
+
+class RadioTemplate:
+    """
+    Template of a RadioData file.
+    the source file is read again for each language and written with the translations while it is read.
+    """
+
+    def __init__(self, file: "RadioData", fp: Path):
+        self.file = file
+        self.fp = fp
+
+    def render(self, write: Callable[[str], object], mapping: dict):
+        'write the source file with the line texts of mapping, lines missing from mapping keep the source text'
+        self.file.stream(self.fp, None, False, write, mapping)
+
+    def substitute(self, mapping: dict) -> str:
+        'rendered template as a string'
+
+        parts = []
+        self.render(parts.append, mapping)
+        return "".join(parts)
+
+class RadioData(TranslateType):
+    """
+    TV and radio broadcasts: RadioData_{language}.xml in the radio folder.
+    the texts of LineEntry elements are translated, the ID attribute is the key.
+    files are read with a streaming xml parser and translations are written while reading the source,
+    so documents are never loaded whole.
+    """
+
+    name = "RadioData"
+    LINE = "LineEntry"
+    LANGUAGE = "Language"
+
+    def __init__(self, parent, folder: str = None):
+        super().__init__(parent)
+        if folder is None:
+            path = parent.get_radio_path()
+            folder = os.path.relpath(path, parent.root) if path else "TV_Radio"
+        self.folder = folder
+
+    def get_path(self, lang: str) -> str:
+        return f'{self.folder}/{self.name}_{lang}.xml'
+
+    def get_charset(self, lang: dict) -> str:
+        # the xml declaration sets the encoding, translations are written as utf-8
+        return "UTF-8"
+
+    def parse_source(self, fp: Path, lang: dict) -> Tuple[RadioTemplate, dict]:
+        mapping = {}
+        self.stream(fp, mapping, True)
+        return RadioTemplate(self, fp), mapping
+
+    def parse_translation(self, fp: Path, lang: dict, mapping: dict, is_import: bool = False):
+        self.stream(fp, mapping, not is_import)
+
+    def stream(self, fp: Path, mapping: dict | None, check_duplicate: bool, write: Callable[[str], object] = None, translations: dict = None):
+        """
+        read the file with a streaming parser and add the line texts to mapping.
+        with write the file is written again while reading, with the line texts and language name of translations.
+        """
+
+        from xml.parsers import expat
+
+        warn = self.parent.warn
+        language_name = translations.get("__language_name__") if translations else None
+        parser = expat.ParserCreate()
+        parser.ordered_attributes = True
+        parser.buffer_text = True
+        # ID of the line being read, "" for lines without ID, None outside lines
+        key = None
+        language = False
+        cdata = False
+        text = []
+
+        def start(name: str, attributes: list):
+            nonlocal key, language
+            if write:
+                attrs = "".join(f' {attributes[i]}="{xml_escape(attributes[i + 1], True)}"' for i in range(0, len(attributes), 2))
+                write(f"<{name}{attrs}>")
+            if name == self.LINE:
+                key = next((attributes[i + 1] for i in range(0, len(attributes), 2) if attributes[i] == "ID"), "")
+                if not key and mapping is not None:
+                    warn(f"{self.LINE} without ID in {fp.name} line {parser.CurrentLineNumber}")
+                text.clear()
+            elif name == self.LANGUAGE:
+                language = True
+
+        def end(name: str):
+            nonlocal key, language
+            if name == self.LINE and key is not None:
+                value = "".join(text)
+                if key and mapping is not None:
+                    if check_duplicate and key in mapping:
+                        warn(f'Duplicate key: {key}')
+                    if not value.strip():
+                        warn(f'{key} is missing translation')
+                    mapping[key] = value
+                if write:
+                    translated = translations.get(key) if key else None
+                    write(xml_escape(value if translated is None else translated, breaks=True))
+                key = None
+            elif name == self.LANGUAGE and language:
+                if write and language_name:
+                    write(language_name)
+                language = False
+            if write:
+                write(f"</{name}>")
+
+        def characters(data: str):
+            if key is not None:
+                text.append(data)
+            elif write and not (language and language_name):
+                write(data if cdata else xml_escape(data))
+
+        def declaration(version: str, encoding: str, standalone: int):
+            standalone = "" if standalone == -1 else f' standalone="{"yes" if standalone else "no"}"'
+            write(f'<?xml version="{version}" encoding="utf-8"{standalone}?>')
+
+        def set_cdata(value: bool):
+            nonlocal cdata
+            cdata = value
+            # line texts are written escaped at the end of the line, and the language name replaces the section
+            if key is None and not (language and language_name):
+                write("<![CDATA[" if value else "]]>")
+
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = characters
+        if write:
+            parser.XmlDeclHandler = declaration
+            parser.CommentHandler = lambda data: write(f"<!--{data}-->")
+            parser.ProcessingInstructionHandler = lambda target, data: write(f"<?{target} {data}?>")
+            parser.StartCdataSectionHandler = lambda: set_cdata(True)
+            parser.EndCdataSectionHandler = lambda: set_cdata(False)
+            # whitespace outside the root element and the doctype are written as they are
+            parser.DefaultHandlerExpand = write
+        try:
+            with open(fp, "rb") as f:
+                parser.ParseFile(f)
+        except expat.ExpatError as e:
+            if write:
+                raise
+            warn(f"Invalid xml in {fp.name}: {e}")
+
 TRANSLATION_TYPES = {
     "Challenge": Challenge,
     "ContextMenu": ContextMenu,
@@ -317,5 +559,5 @@ TRANSLATION_TYPES = {
     "Tooltip": Tooltip,
     "UI": UI,
     "MapInfo": MapInfo,
-    # "RadioData": , #skip for now
+    "RadioData": RadioData,
 }
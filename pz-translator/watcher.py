@@ -0,0 +1,164 @@
+"""
+Watch folders for changed files: inotify on Linux, polling on other systems
+"""
+
+import os
+import sys
+import time
+import errno
+import struct
+import select
+from pathlib import Path
+from typing import Iterator
+from dir_index import DirectoryIndex
+
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# saved files, files moved in or out and new folders
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# struct inotify_event: wd, mask, cookie, len, followed by the name
+EVENT = struct.Struct("iIII")
+
+class InotifyWatcher:
+    """
+    Watches the folders and their subfolders with inotify through ctypes.
+    read returns the changed paths, the folders themselves when events were lost.
+    """
+
+    def __init__(self, folders: list[Path]):
+        import ctypes
+        import ctypes.util
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+        self.folders = folders
+        self.watches: dict[int, Path] = {}
+        for folder in folders:
+            self.add_tree(folder)
+
+    def add_tree(self, folder: Path):
+        'watch the folder and its subfolders'
+
+        for path, _, _ in os.walk(folder):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+            if wd >= 0:
+                self.watches[wd] = Path(path)
+
+    def read(self, timeout: float | None) -> set[Path]:
+        'wait up to timeout seconds for events, None waits until there are events'
+
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return set()
+            raise
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT.unpack_from(data, offset)
+            name = data[offset + EVENT.size:offset + EVENT.size + length].rstrip(b"\0")
+            offset += EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                changed.update(self.folders)
+                continue
+            folder = self.watches.get(wd)
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            if folder is None or not name:
+                continue
+            path = folder / os.fsdecode(name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # files can be in the folder before it is watched
+                    self.add_tree(path)
+                    changed.update(Path(x, y) for x, _, files in os.walk(path) for y in files)
+                continue
+            changed.add(path)
+        return changed
+
+    def close(self):
+        'stop watching'
+        os.close(self.fd)
+
+class PollingWatcher:
+    """
+    Compares the size and mtime of the files in the folders every interval seconds.
+    """
+
+    def __init__(self, folders: list[Path], interval: float = 1.0):
+        self.folders = folders
+        self.interval = interval
+        self.snapshots = {folder: DirectoryIndex(folder).files for folder in folders}
+
+    def poll(self) -> set[Path]:
+        'changed paths since the last poll'
+
+        changed = set()
+        for folder in self.folders:
+            files = DirectoryIndex(folder).files
+            old = self.snapshots[folder]
+            changed.update(folder / x for x in files.keys() | old.keys() if files.get(x) != old.get(x))
+            self.snapshots[folder] = files
+        return changed
+
+    def read(self, timeout: float | None) -> set[Path]:
+        'wait up to timeout seconds for changes, None waits until there are changes'
+
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.interval if end is None else min(self.interval, end - time.monotonic())
+            if wait > 0:
+                time.sleep(wait)
+            changed = self.poll()
+            if changed or end is not None and time.monotonic() >= end:
+                return changed
+
+    def close(self):
+        'stop watching'
+
+def create_watcher(folders: list[Path], poll: bool = False) -> InotifyWatcher | PollingWatcher:
+    'inotify watcher on Linux, polling watcher on other systems, when inotify fails or with poll'
+
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(folders)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(folders)
+
+def watch(folders: list[Path], debounce: float = 0.3, poll: bool = False) -> Iterator[set[Path]]:
+    """
+    yield the changed paths in the folders.
+    changes are collected until there were none for debounce seconds, so a burst of saves is one change.
+    """
+
+    watcher = create_watcher(folders, poll)
+    try:
+        while True:
+            changed = watcher.read(None)
+            while changed:
+                more = watcher.read(debounce)
+                if not more:
+                    break
+                changed |= more
+            if changed:
+                yield changed
+    finally:
+        watcher.close()